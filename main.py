@@ -1,12 +1,21 @@
 """
 Multi-tenant SaaS FastAPI Application
 """
-from fastapi import FastAPI,Depends
+from fastapi import FastAPI,Depends,Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
+import asyncio
 from src.utils.config import get_settings
 from src.routes.auth.router import router as auth_router
+from src.routes.uploads.router import router as uploads_router
+from src.routes.users.router import router as users_router
+from src.routes.uploads.config import shutdown_image_pool
+from src.routes.auth.models import client as auth_client
+from src.database.connection import client as saas_client, tenant_router
+from src.utils.monitoring import loop_monitor, pool_snapshot, ping_client
+from src.database.guard import DatabaseUnavailable, db_guard
 
 settings = get_settings()
 
@@ -22,8 +31,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     print("🚀 Starting MLG SaaS API...")
+    loop_monitor.start()
     yield
     # Shutdown
+    await loop_monitor.stop()
+    shutdown_image_pool()
     print("🛑 Shutting down MLG SaaS API...")
 
 
@@ -65,6 +77,15 @@ app.add_middleware(
 
 
 
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    """Shed load with 503 when a Mongo call times out or the breaker is open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 
 @app.get("/health")
 async def health_check():
@@ -75,6 +96,31 @@ async def health_check():
         "version": "1.0.0"
     }
 
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness check: pings MongoDB and reports pool usage and event-loop lag"""
+    clients = {"auth": auth_client, "saas": saas_client}
+    clients.update({f"shard:{shard}": client for shard, client in tenant_router.clients().items()})
+    pings = await asyncio.gather(*(
+        ping_client(client, settings.HEALTH_PING_TIMEOUT_SECONDS) for client in clients.values()
+    ))
+    databases = dict(zip(clients, pings))
+    loop = loop_monitor.snapshot()
+
+    ready = all(db["status"] == "up" for db in databases.values())
+    degraded = loop["avg_ms"] > settings.LOOP_LAG_DEGRADED_MS or db_guard.is_degraded()
+    body = {
+        "status": "unavailable" if not ready else "degraded" if degraded else "ready",
+        "service": "Agra Heritage SaaS API",
+        "version": "1.0.0",
+        "databases": databases,
+        "connection_pools": pool_snapshot(),
+        "event_loop_lag": loop,
+        "db_guard": db_guard.snapshot(),
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
 @app.get("/")
 def test():
     return {
@@ -85,6 +131,8 @@ def test():
 
 
 app.include_router(auth_router, prefix=f"{settings.API_BASE_PATH}")
+app.include_router(uploads_router, prefix=f"{settings.API_BASE_PATH}")
+app.include_router(users_router, prefix=f"{settings.API_BASE_PATH}")
 
 
 if __name__ == "__main__":
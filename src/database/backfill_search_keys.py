@@ -0,0 +1,52 @@
+"""
+Fill in `search_keys` on users created before prefix search existed.
+
+Usage:
+    python -m src.database.backfill_search_keys [--batch-size N]
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from src.database.connection import tenant_router, users_collection
+from src.database.search import search_keys_for
+from src.utils.config import get_settings
+
+settings = get_settings()
+
+
+async def backfill(collection, batch_size: int) -> int:
+    updated = 0
+    last_id = None
+    projection = {"first_name": 1, "last_name": 1, "email": 1}
+    while True:
+        query = {"search_keys": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return updated
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": {"search_keys": search_keys_for(doc)}}) for doc in batch]
+        result = await collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        last_id = batch[-1]["_id"]
+
+
+async def run(batch_size: int):
+    collections = [("default", users_collection)]
+    collections += [(shard, tenant_router.database(shard).users) for shard in settings.TENANT_SHARDS]
+    for shard, collection in collections:
+        updated = await backfill(collection, batch_size)
+        print(f"{shard}: added search keys to {updated} users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill users.search_keys")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
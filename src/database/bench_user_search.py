@@ -0,0 +1,115 @@
+"""
+Benchmark tenant-scoped user prefix search.
+
+Seeds a throwaway tenant (one million users by default), then times prefix
+lookups against MongoDB with the autocomplete cache bypassed, and again with
+the cache warm. Also prints the winning plan to confirm the lookup is a
+bounded IXSCAN on (company_id, search_keys).
+
+The uncached p99 is checked against --target-ms (1 ms by default); the
+script exits non-zero if it is missed.
+
+Usage:
+    python -m src.database.bench_user_search [--users N] [--queries N] [--target-ms MS] [--keep]
+"""
+import argparse
+import asyncio
+import random
+import string
+import sys
+import time
+from uuid import uuid4
+
+from src.database.connection import CompanyDatabase, create_indexes, user_search_cache, users_collection
+from src.database.search import prefix_query, search_keys_for
+
+FIRST_NAMES = ["aarav", "aditi", "arjun", "diya", "ishaan", "kavya", "meera", "nikhil",
+               "priya", "rahul", "riya", "rohan", "saanvi", "sneha", "tanvi", "vivaan"]
+
+
+def fake_user(company_id, n: int) -> dict:
+    first = random.choice(FIRST_NAMES)
+    last = "".join(random.choices(string.ascii_lowercase, k=7)).capitalize()
+    user = {
+        "id": uuid4(),
+        "company_id": company_id,
+        "first_name": first.capitalize(),
+        "last_name": last,
+        "email": f"{first}.{last.lower()}{n}@{company_id.hex[:8]}.bench.example",
+        "username": f"bench{n}",
+        "role": "user",
+        "is_active": True,
+    }
+    user["search_keys"] = search_keys_for(user)
+    return user
+
+
+async def seed(company_id, count: int, batch_size: int = 10000):
+    for start in range(0, count, batch_size):
+        batch = [fake_user(company_id, n) for n in range(start, min(start + batch_size, count))]
+        await users_collection.insert_many(batch, ordered=False)
+        print(f"  seeded {start + len(batch)}/{count}", end="\r")
+    print()
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+async def time_queries(db: CompanyDatabase, prefixes, bypass_cache: bool):
+    samples = []
+    for prefix in prefixes:
+        if bypass_cache:
+            user_search_cache.clear()
+        start = time.perf_counter()
+        await db.search_users(prefix, limit=10)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples, target_ms: float) -> bool:
+    """Print latency percentiles; True if p99 is within target_ms"""
+    p99 = percentile(samples, 0.99)
+    passed = p99 <= target_ms
+    print(f"{label}: p50 {percentile(samples, 0.50):.3f} ms, p99 {p99:.3f} ms, "
+          f"max {max(samples):.3f} ms -> {'PASS' if passed else 'FAIL'} (target p99 <= {target_ms} ms)")
+    return passed
+
+
+async def run(users: int, queries: int, target_ms: float, keep: bool) -> bool:
+    company_id = uuid4()
+    print(f"Benchmark tenant {company_id}")
+    await create_indexes()
+    await seed(company_id, users)
+
+    db = CompanyDatabase(str(company_id))
+    plan = await users_collection.find(prefix_query(company_id, "pri")).limit(40).explain()
+    print("Winning plan:", plan["queryPlanner"]["winningPlan"])
+
+    prefixes = [random.choice(FIRST_NAMES)[:random.randint(1, 4)] for _ in range(queries)]
+    prefixes += ["".join(random.choices(string.ascii_lowercase, k=3)) for _ in range(queries)]
+    random.shuffle(prefixes)
+
+    await time_queries(db, prefixes[:50], bypass_cache=True)  # warm the connection pool
+    passed = report("uncached", await time_queries(db, prefixes, bypass_cache=True), target_ms)
+    report("cache on", await time_queries(db, prefixes, bypass_cache=False), target_ms)
+
+    if not keep:
+        await users_collection.delete_many({"company_id": company_id})
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user prefix search")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--target-ms", type=float, default=1.0, help="Uncached p99 latency to meet")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded tenant afterwards")
+    args = parser.parse_args()
+    if not asyncio.run(run(args.users, args.queries, args.target_ms, args.keep)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,28 @@
 """
 MongoDB Database Configuration for Multi-tenant SaaS
 """
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from src.utils.config import get_settings
+from src.utils.monitoring import pool_listener_for
+from src.database.guard import db_guard
+from src.database.sharding import STATUS_COPYING, TenantRouter, create_user_indexes
+from src.utils.ids import as_uuid, id_match
+from src.database.search import MAX_QUERY_LENGTH, SearchCache, normalize, prefix_query, rank, search_keys_for
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 # MongoDB Connection
-client = AsyncIOMotorClient(settings.MONGODB_URI)
+client = AsyncIOMotorClient(
+    settings.MONGODB_URI,
+    maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+    uuidRepresentation="standard",
+    event_listeners=[pool_listener_for("saas")],
+)
+
+db_guard.register(client, "saas")
 
 # Main SaaS Database
 saas_db = client.agra_heritage_saas
@@ -17,6 +32,20 @@ super_admins_collection = saas_db.super_admins
 companies_collection = saas_db.companies
 pricing_plans_collection = saas_db.pricing_plans
 users_collection = saas_db.users
+tenant_placements_collection = saas_db.tenant_placements
+
+# Routes company_id -> shard; unplaced tenants stay in saas_db
+tenant_router = TenantRouter(
+    saas_db,
+    shards=settings.TENANT_SHARDS,
+    cache_seconds=settings.TENANT_PLACEMENT_CACHE_SECONDS,
+)
+
+# Repeated autocomplete prefixes are served from here for a few seconds
+user_search_cache = SearchCache(
+    ttl_seconds=settings.USER_SEARCH_CACHE_SECONDS,
+    max_entries=settings.USER_SEARCH_CACHE_SIZE,
+)
 
 # Indexes for performance and data integrity
 async def create_indexes():
@@ -33,12 +62,13 @@ async def create_indexes():
     await companies_collection.create_index("subscription_plan_id")
     await companies_collection.create_index("created_at")
     
-    # Users indexes (Critical for multi-tenant isolation)
-    await users_collection.create_index([("email", 1)], unique=True)
-    await users_collection.create_index([("username", 1), ("company_id", 1)], unique=True)
-    await users_collection.create_index("company_id")  # Critical for tenant isolation
-    await users_collection.create_index([("company_id", 1), ("role", 1)])
-    await users_collection.create_index([("company_id", 1), ("is_active", 1)])
+    # Users indexes (Critical for multi-tenant isolation), on every shard
+    await create_user_indexes(users_collection)
+    for shard in settings.TENANT_SHARDS:
+        await create_user_indexes(tenant_router.database(shard).users)
+    
+    # Tenant placement table
+    await tenant_placements_collection.create_index("company_id", unique=True)
     
     # Pricing plans indexes
     await pricing_plans_collection.create_index("name", unique=True)
@@ -49,70 +79,130 @@ async def create_indexes():
 # Utility functions for database operations
 async def get_company_user_count(company_id: str) -> int:
     """Get current user count for a company"""
-    return await users_collection.count_documents({
-        "company_id": company_id,
+    users = await tenant_router.collection(company_id)
+    return await db_guard.read(users.count_documents, {
+        "company_id": id_match(company_id),
         "is_active": True
     })
 
 async def update_company_user_count(company_id: str):
     """Update the current_user_count field for a company"""
     count = await get_company_user_count(company_id)
-    await companies_collection.update_one(
-        {"id": company_id},
+    await db_guard.write(
+        companies_collection.update_one,
+        {"id": id_match(company_id)},
         {"$set": {"current_user_count": count}}
     )
 
 # Company-specific database operations
 class CompanyDatabase:
-    """Handles company-scoped database operations"""
+    """Handles company-scoped database operations, routed to the tenant's shard"""
     
     def __init__(self, company_id: str):
         self.company_id = company_id
+        self._company_match = id_match(company_id)
+    
+    async def _users(self):
+        return await tenant_router.collection(self.company_id)
+    
+    async def _write(self, op: str, *args, **kwargs):
+        """Apply a write to every collection the tenant currently writes to"""
+        placement = await tenant_router.placement(self.company_id)
+        collections = await tenant_router.write_collections(self.company_id)
+        result = await db_guard.write(getattr(collections[0], op), *args, **kwargs)
+        for mirror in collections[1:]:
+            try:
+                await db_guard.write(getattr(mirror, op), *args, **kwargs)
+            except DuplicateKeyError:
+                pass  # the tenant move already copied this document
+            except Exception:
+                logger.warning("Dual write %s for company %s failed on %s",
+                               op, self.company_id, mirror.full_name, exc_info=True)
+                if placement["status"] != STATUS_COPYING:
+                    continue  # mirror is the retiring source shard
+                # Mirror is the move target: make the move reconcile again,
+                # unless reads already switched to it, in which case fail
+                if not await tenant_router.record_mirror_failure(self.company_id):
+                    raise
+        return result
     
     async def get_users(self, skip: int = 0, limit: int = 100):
         """Get users for this company only"""
-        cursor = users_collection.find(
-            {"company_id": self.company_id}
+        users = await self._users()
+        cursor = users.find(
+            {"company_id": self._company_match}
         ).skip(skip).limit(limit)
-        return await cursor.to_list(length=limit)
+        return await db_guard.read(cursor.to_list, length=limit)
     
     async def get_user_by_id(self, user_id: str):
         """Get a user by ID, scoped to company"""
-        return await users_collection.find_one({
-            "id": user_id,
-            "company_id": self.company_id
+        users = await self._users()
+        return await db_guard.read(users.find_one, {
+            "id": id_match(user_id),
+            "company_id": self._company_match
         })
     
     async def get_user_by_email(self, email: str):
         """Get a user by email, scoped to company"""
-        return await users_collection.find_one({
+        users = await self._users()
+        return await db_guard.read(users.find_one, {
             "email": email,
-            "company_id": self.company_id
+            "company_id": self._company_match
         })
     
     async def create_user(self, user_data: dict):
         """Create a user for this company"""
-        user_data["company_id"] = self.company_id
-        result = await users_collection.insert_one(user_data)
+        user_data["company_id"] = as_uuid(self.company_id)
+        user_data["search_keys"] = search_keys_for(user_data)
+        result = await self._write("insert_one", user_data)
         await update_company_user_count(self.company_id)
         return result
     
     async def update_user(self, user_id: str, update_data: dict):
         """Update a user, scoped to company"""
-        result = await users_collection.update_one(
-            {"id": user_id, "company_id": self.company_id},
+        if {"first_name", "last_name", "email"} & update_data.keys():
+            current = await self.get_user_by_id(user_id) or {}
+            update_data = {**update_data, "search_keys": search_keys_for({**current, **update_data})}
+        result = await self._write(
+            "update_one",
+            {"id": id_match(user_id), "company_id": self._company_match},
             {"$set": update_data}
         )
         return result
     
     async def delete_user(self, user_id: str):
         """Soft delete a user (set inactive)"""
-        result = await users_collection.update_one(
-            {"id": user_id, "company_id": self.company_id},
+        result = await self._write(
+            "update_one",
+            {"id": id_match(user_id), "company_id": self._company_match},
             {"$set": {"is_active": False}}
         )
         await update_company_user_count(self.company_id)
         return result
+    
+    async def search_users(self, query: str, limit: int = 10):
+        """Ranked prefix search on name and email, scoped to company"""
+        prefix = normalize(query)[:MAX_QUERY_LENGTH]
+        if not prefix:
+            return []
+        
+        cache_key = (str(self.company_id), prefix, limit)
+        cached = user_search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Over-fetch a little so ranking can promote exact and name matches
+        candidates = min(limit * 4, 200)
+        users = await self._users()
+        cursor = users.find(
+            {**prefix_query(self._company_match, prefix), "is_active": {"$ne": False}},
+            {"_id": 0, "id": 1, "first_name": 1, "last_name": 1, "email": 1, "role": 1},
+        ).limit(candidates)
+        found = await db_guard.read(cursor.to_list, length=candidates)
+        
+        results = rank(found, prefix)[:limit]
+        user_search_cache.put(cache_key, results)
+        return results
 
 # Initialize database setup
 async def init_database():
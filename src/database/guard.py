@@ -0,0 +1,235 @@
+"""
+Deadlines and a circuit breaker around MongoDB calls
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+import pymongo
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection,
+    AsyncIOMotorCommandCursor,
+    AsyncIOMotorCursor,
+    AsyncIOMotorDatabase,
+    AsyncIOMotorLatentCommandCursor,
+)
+from pymongo.errors import PyMongoError
+
+from src.utils.config import get_settings
+
+settings = get_settings()
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when a database call is shed or does not finish in time"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DatabaseTimeout(DatabaseUnavailable):
+    """The operation exceeded its deadline"""
+
+
+class CircuitOpenError(DatabaseUnavailable):
+    """The breaker is open, so the call was rejected without touching Mongo"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive timeouts and rejects calls for
+    `reset_seconds`. After that a single trial call is let through
+    (half-open): success closes the breaker, another timeout re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_timeouts = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def admit(self) -> Optional[bool]:
+        """
+        Decide whether a call may run. Returns None if rejected, otherwise
+        whether the call is the half-open trial; pass that back to record_*.
+        """
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return None
+
+    def record_success(self, trial: bool):
+        # Calls admitted before the breaker opened may still finish; only the
+        # trial's outcome decides whether a half-open breaker closes
+        if trial:
+            self._trial_in_flight = False
+            self._close()
+        elif self.state == self.CLOSED:
+            self.consecutive_timeouts = 0
+
+    def record_timeout(self, trial: bool):
+        if trial:
+            self._trial_in_flight = False
+            self._open()
+        elif self.state == self.CLOSED:
+            self.consecutive_timeouts += 1
+            if self.consecutive_timeouts >= self.failure_threshold:
+                self._open()
+
+    def release(self, trial: bool):
+        """A call finished with a non-timeout error: free the trial slot"""
+        if trial:
+            self._trial_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.consecutive_timeouts = 0
+        self.opened_at = None
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 1
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        return max(int(remaining + 0.999), 1)
+
+
+class ClientGuard:
+    """Breaker and counters for one Motor client (auth, saas or a shard)"""
+
+    def __init__(self, label: str, breaker: CircuitBreaker):
+        self.label = label
+        self.breaker = breaker
+        self.timeouts = {"read": 0, "write": 0}
+        self.rejected = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_timeouts": self.breaker.consecutive_timeouts,
+            "times_opened": self.breaker.times_opened,
+            "timeouts": dict(self.timeouts),
+            "rejected": self.rejected,
+        }
+
+
+def _client_of(fn) -> Optional[AsyncIOMotorClient]:
+    """Find the Motor client behind a bound collection/cursor method"""
+    target = getattr(fn, "__self__", None)
+    # aggregate() returns a latent command cursor, which is not a subclass
+    # of the plain command cursor
+    if isinstance(target, (AsyncIOMotorCursor, AsyncIOMotorCommandCursor, AsyncIOMotorLatentCommandCursor)):
+        target = target.collection
+    if isinstance(target, AsyncIOMotorCollection):
+        target = target.database
+    if isinstance(target, AsyncIOMotorDatabase):
+        target = target.client
+    return target if isinstance(target, AsyncIOMotorClient) else None
+
+
+class DatabaseGuard:
+    """
+    Runs Motor calls under a per-operation deadline, with one breaker per
+    registered client so a slow shard only sheds its own tenants.
+
+    The deadline is enforced client-side with asyncio and server-side with
+    pymongo.timeout(), which sets maxTimeMS on each operation, so work the
+    caller has given up on does not keep running on the primary.
+    """
+
+    def __init__(self, read_timeout: float, write_timeout: float, failure_threshold: int, reset_seconds: float):
+        self.deadlines = {"read": read_timeout, "write": write_timeout}
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clients: Dict[int, ClientGuard] = {}
+        self._fallback = self._new_guard("other")
+
+    def _new_guard(self, label: str) -> ClientGuard:
+        return ClientGuard(label, CircuitBreaker(self.failure_threshold, self.reset_seconds))
+
+    def register(self, client: AsyncIOMotorClient, label: str):
+        """Give a client its own breaker; calls on unregistered clients share one"""
+        self._clients[id(client)] = self._new_guard(label)
+
+    def _guard_for(self, fn) -> ClientGuard:
+        client = _client_of(fn)
+        return self._clients.get(id(client), self._fallback) if client is not None else self._fallback
+
+    async def _run(self, kind: str, fn, *args, **kwargs):
+        guard = self._guard_for(fn)
+        breaker = guard.breaker
+        trial = breaker.admit()
+        if trial is None:
+            guard.rejected += 1
+            raise CircuitOpenError(
+                f"Database circuit for {guard.label} open; retry in {breaker.retry_after()}s",
+                retry_after=breaker.retry_after(),
+            )
+
+        deadline = self.deadlines[kind]
+        try:
+            with pymongo.timeout(deadline):
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._timed_out(guard, kind, trial)
+            raise DatabaseTimeout(f"Database {kind} on {guard.label} exceeded {deadline:.1f}s deadline")
+        except PyMongoError as e:
+            if not e.timeout:
+                breaker.release(trial)
+                raise
+            self._timed_out(guard, kind, trial)
+            raise DatabaseTimeout(f"Database {kind} on {guard.label} timed out: {e}") from e
+        except BaseException:
+            breaker.release(trial)
+            raise
+
+        breaker.record_success(trial)
+        return result
+
+    def _timed_out(self, guard: ClientGuard, kind: str, trial: bool):
+        guard.timeouts[kind] += 1
+        guard.breaker.record_timeout(trial)
+
+    async def read(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) under the read deadline"""
+        return await self._run("read", fn, *args, **kwargs)
+
+    async def write(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) under the write deadline"""
+        return await self._run("write", fn, *args, **kwargs)
+
+    def is_degraded(self) -> bool:
+        guards = [self._fallback, *self._clients.values()]
+        return any(guard.breaker.state != CircuitBreaker.CLOSED for guard in guards)
+
+    def snapshot(self) -> dict:
+        guards = [*self._clients.values(), self._fallback]
+        return {
+            "deadlines_ms": {kind: int(seconds * 1000) for kind, seconds in self.deadlines.items()},
+            "clients": {guard.label: guard.snapshot() for guard in guards},
+        }
+
+
+db_guard = DatabaseGuard(
+    read_timeout=settings.DB_READ_TIMEOUT_MS / 1000,
+    write_timeout=settings.DB_WRITE_TIMEOUT_MS / 1000,
+    failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=settings.DB_BREAKER_RESET_SECONDS,
+)
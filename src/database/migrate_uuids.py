@@ -0,0 +1,121 @@
+"""
+Rewrite string UUID ids as BSON binary UUIDs (subtype 4), online.
+
+Documents are scanned in _id order and updated in batches. Each update is
+conditional on the field still holding the old string, so concurrent writes
+are never overwritten. Reads keep working throughout via id_match().
+
+Usage:
+    python -m src.database.migrate_uuids [--batch-size N] [--pause-ms N]
+"""
+import argparse
+import asyncio
+from uuid import UUID
+
+from pymongo import UpdateOne
+
+from src.database.connection import companies_collection, tenant_router, users_collection as saas_users_collection
+from src.routes.auth.models import users_collection as auth_users_collection
+from src.routes.uploads.models import uploads_collection
+from src.utils.config import get_settings
+
+settings = get_settings()
+
+USER_FIELDS = ["id", "company_id", "avatar_upload_id"]
+
+
+def targets():
+    """(label, collection, fields) for every collection holding UUID keys"""
+    found = [
+        ("auth.users", auth_users_collection, USER_FIELDS),
+        ("auth.uploads", uploads_collection, ["id", "user_id"]),
+        ("saas.users", saas_users_collection, USER_FIELDS),
+        ("saas.companies", companies_collection, ["id"]),
+    ]
+    for shard in settings.TENANT_SHARDS:
+        found.append((f"shard:{shard}.users", tenant_router.database(shard).users, USER_FIELDS))
+    return found
+
+
+async def index_sizes(collection) -> dict:
+    """Total and per-index size in bytes"""
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+    if not stats:
+        return {"total": 0, "indexes": {}}
+    storage = stats[0]["storageStats"]
+    return {"total": storage.get("totalIndexSize", 0), "indexes": storage.get("indexSizes", {})}
+
+
+def _to_uuid(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return UUID(value)
+    except ValueError:
+        return None
+
+
+async def migrate_collection(collection, fields, batch_size: int, pause: float) -> int:
+    """Convert string UUIDs in `fields`; returns the number of documents changed"""
+    changed = 0
+    last_id = None
+    any_string = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+
+    while True:
+        query = dict(any_string)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return changed
+
+        ops = []
+        for doc in batch:
+            match = {"_id": doc["_id"]}
+            update = {}
+            for field in fields:
+                converted = _to_uuid(doc.get(field))
+                if converted is not None:
+                    match[field] = doc[field]
+                    update[field] = converted
+            if update:
+                ops.append(UpdateOne(match, {"$set": update}))
+        if ops:
+            result = await collection.bulk_write(ops, ordered=False)
+            changed += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        if pause:
+            await asyncio.sleep(pause)
+
+
+def _fmt(size: int) -> str:
+    return f"{size / 1024:.1f} KiB"
+
+
+async def run(batch_size: int, pause: float):
+    for label, collection, fields in targets():
+        before = await index_sizes(collection)
+        changed = await migrate_collection(collection, fields, batch_size, pause)
+        after = await index_sizes(collection)
+
+        print(f"{label}: converted {changed} documents")
+        print(f"  index size {_fmt(before['total'])} -> {_fmt(after['total'])}")
+        for name in sorted(set(before["indexes"]) | set(after["indexes"])):
+            print(f"    {name}: {_fmt(before['indexes'].get(name, 0))} -> {_fmt(after['indexes'].get(name, 0))}")
+
+    print("Done. Index sizes may shrink further after compaction; "
+          "set UUID_LEGACY_STRING_READS=false once no string ids remain.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert string UUID ids to BSON binary UUIDs")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=int, default=0, help="Sleep between batches to limit load")
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.pause_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
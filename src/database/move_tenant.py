@@ -0,0 +1,44 @@
+"""
+Move a tenant to another shard while it stays online.
+
+Usage:
+    python -m src.database.move_tenant <company_id> <shard> [--batch-size N] [--cleanup]
+    python -m src.database.move_tenant <company_id> --abort
+
+Running a move again after it stopped past the read switch finishes it.
+--abort stops a move that has not switched reads yet (e.g. after a crash)
+and removes the partial copy from the target shard.
+"""
+import argparse
+import asyncio
+
+from src.database.connection import tenant_router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move a tenant's data to another shard")
+    parser.add_argument("company_id")
+    parser.add_argument("shard", nargs="?", help="Target shard name from TENANT_SHARDS, or 'default'")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--cleanup", action="store_true", help="Delete the tenant's documents from the old shard")
+    parser.add_argument("--abort", action="store_true", help="Abort an unfinished move and keep the old shard")
+    args = parser.parse_args()
+
+    if args.abort:
+        removed = asyncio.run(tenant_router.abort_move(args.company_id))
+        print({"company_id": args.company_id, "aborted": True, "removed": removed})
+        return
+    if args.shard is None:
+        parser.error("shard is required unless --abort is given")
+
+    summary = asyncio.run(tenant_router.move_tenant(
+        args.company_id,
+        args.shard,
+        batch_size=args.batch_size,
+        cleanup=args.cleanup,
+    ))
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
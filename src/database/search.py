@@ -0,0 +1,85 @@
+"""
+Prefix search over users within a tenant.
+
+Each user document carries `search_keys`: lowercase first name, last name,
+full name, email and email local part. A compound (company_id, search_keys)
+index turns a prefix lookup into a single bounded index range scan.
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+MAX_QUERY_LENGTH = 64
+
+# Highest code point, so [prefix, prefix + MAX_CHAR) covers every extension
+MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, trim and collapse internal whitespace"""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def search_keys_for(user: dict) -> List[str]:
+    """Keys a user can be found by"""
+    first = normalize(user.get("first_name"))
+    last = normalize(user.get("last_name"))
+    email = normalize(user.get("email"))
+    keys = [first, last, normalize(f"{first} {last}"), email, email.split("@")[0]]
+    return sorted({key for key in keys if key})
+
+
+def prefix_query(company_match: Any, prefix: str) -> dict:
+    # $elemMatch keeps both bounds on the same array element, so the
+    # multikey index scan stays [prefix, prefix + MAX_CHAR) instead of
+    # an open-ended range
+    return {
+        "company_id": company_match,
+        "search_keys": {"$elemMatch": {"$gte": prefix, "$lt": prefix + MAX_CHAR}},
+    }
+
+
+def rank(users: List[dict], prefix: str) -> List[dict]:
+    """Exact matches first, then name prefixes, then email prefixes"""
+    def score(user: dict) -> Tuple[int, str]:
+        first = normalize(user.get("first_name"))
+        last = normalize(user.get("last_name"))
+        full = normalize(f"{first} {last}")
+        email = normalize(user.get("email"))
+        if prefix in (first, last, full, email):
+            tier = 0
+        elif full.startswith(prefix) or first.startswith(prefix) or last.startswith(prefix):
+            tier = 1
+        else:
+            tier = 2
+        return tier, full
+    return sorted(users, key=score)
+
+
+class SearchCache:
+    """Short-lived LRU for repeated autocomplete prefixes"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[List[dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, results: List[dict]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,347 @@
+"""
+Tenant routing: maps each company_id to the shard holding its data
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.utils.config import get_settings
+from src.utils.monitoring import pool_listener_for
+from src.database.guard import db_guard
+from src.utils.ids import id_match
+
+settings = get_settings()
+
+DEFAULT_SHARD = "default"
+
+# Placement states. While a tenant is moving, writes go to both shards so
+# workers holding a stale cached placement never lose data.
+STATUS_ACTIVE = "active"
+STATUS_COPYING = "copying"    # reads from source, writes to source + target
+STATUS_CUTOVER = "cutover"    # reads from target, writes to source + target
+
+# Reconcile passes before a move gives up instead of switching reads over
+MAX_RECONCILE_PASSES = 10
+
+# Attempts to repair one document before concluding dual writes keep racing it
+MAX_REPAIR_ATTEMPTS = 5
+
+
+class TenantRouter:
+    """
+    Resolves tenants to databases through the `tenant_placements` table.
+
+    Tenants without a placement live on the default shard (the main SaaS
+    database). Other shards are configured in settings.TENANT_SHARDS and get
+    one cached Motor client per URI.
+    """
+
+    def __init__(self, default_db, shards: Optional[Dict[str, str]] = None, cache_seconds: int = 30):
+        self.default_db = default_db
+        self.placements = default_db.tenant_placements
+        self.shards = dict(shards or {})
+        self.cache_seconds = cache_seconds
+        self._clients: Dict[str, AsyncIOMotorClient] = {}
+        self._cache: Dict[str, Tuple[float, dict]] = {}
+
+    def database(self, shard: str):
+        """Get the database for a shard, creating its client on first use"""
+        if shard == DEFAULT_SHARD:
+            return self.default_db
+        uri = self.shards.get(shard)
+        if uri is None:
+            raise KeyError(f"Unknown tenant shard: {shard}")
+        client = self._clients.get(uri)
+        if client is None:
+            client = AsyncIOMotorClient(
+                uri,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                uuidRepresentation="standard",
+                event_listeners=[pool_listener_for(f"shard:{shard}")],
+            )
+            db_guard.register(client, f"shard:{shard}")
+            self._clients[uri] = client
+        return client.get_default_database(default=self.default_db.name)
+
+    def clients(self) -> Dict[str, AsyncIOMotorClient]:
+        """Shard clients created so far, keyed by shard name"""
+        return {
+            name: self._clients[uri]
+            for name, uri in self.shards.items()
+            if uri in self._clients
+        }
+
+    async def placement(self, company_id: str) -> dict:
+        """Get the (cached) placement for a tenant"""
+        company_id = str(company_id)
+        cached = self._cache.get(company_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        placement = await db_guard.read(self.placements.find_one, {"company_id": company_id}, {"_id": 0})
+        if placement is None:
+            placement = {"company_id": company_id, "shard": DEFAULT_SHARD, "status": STATUS_ACTIVE}
+        self._cache[company_id] = (time.monotonic() + self.cache_seconds, placement)
+        return placement
+
+    def invalidate(self, company_id: Optional[str] = None):
+        """Drop cached placements (all of them if no company_id given)"""
+        if company_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(company_id), None)
+
+    async def collection(self, company_id: str, name: str = "users"):
+        """Collection to read a tenant's data from"""
+        placement = await self.placement(company_id)
+        shard = placement["shard"]
+        if placement["status"] == STATUS_CUTOVER:
+            shard = placement["target_shard"]
+        return self.database(shard)[name]
+
+    async def write_collections(self, company_id: str, name: str = "users") -> List:
+        """Collections a write must go to; the first one is authoritative"""
+        placement = await self.placement(company_id)
+        source = self.database(placement["shard"])[name]
+        if placement["status"] == STATUS_ACTIVE:
+            return [source]
+        target = self.database(placement["target_shard"])[name]
+        if placement["status"] == STATUS_CUTOVER:
+            return [target, source]
+        return [source, target]
+
+    async def set_placement(self, company_id: str, **fields):
+        company_id = str(company_id)
+        fields["updated_at"] = datetime.now(timezone.utc)
+        await self.placements.update_one(
+            {"company_id": company_id},
+            {"$set": fields},
+            upsert=True,
+        )
+        self.invalidate(company_id)
+
+    async def record_mirror_failure(self, company_id: str) -> bool:
+        """
+        Note that a dual write to the move target failed, so the move must
+        reconcile again before switching reads. Returns False if reads have
+        already switched, in which case the write did not reach the shard
+        that is now authoritative.
+        """
+        result = await db_guard.write(
+            self.placements.update_one,
+            {"company_id": str(company_id), "status": STATUS_COPYING},
+            {"$inc": {"mirror_failures": 1}},
+        )
+        return result.matched_count == 1
+
+    async def _mirror_failures(self, company_id: str) -> int:
+        placement = await db_guard.read(
+            self.placements.find_one, {"company_id": str(company_id)}, {"mirror_failures": 1}
+        )
+        return (placement or {}).get("mirror_failures", 0)
+
+    async def move_tenant(self, company_id: str, target_shard: str, batch_size: int = 1000,
+                          cleanup: bool = False, log=print) -> dict:
+        """
+        Move a tenant to another shard while it keeps serving traffic.
+
+        Steps: start dual writes, bulk-copy missing documents, reconcile any
+        that changed during the copy, switch reads to the target, then mark
+        the target active. Each state change waits one placement-cache TTL so
+        every worker has picked it up before the next step. Reads only switch
+        if no dual write to the target failed since the last clean reconcile.
+
+        If copying fails the move is aborted (see abort_move). A move that
+        stopped after reads switched is finished by running it again.
+        """
+        placement = await self.placement(company_id)
+        source_shard = placement["shard"]
+        settle = self.cache_seconds + 1
+        copied = repaired = 0
+
+        if placement["status"] == STATUS_CUTOVER and placement["target_shard"] == target_shard:
+            log(f"Reads already switched to {target_shard}; finishing the move")
+            source = self.database(source_shard).users
+        else:
+            if placement["status"] != STATUS_ACTIVE:
+                raise RuntimeError(
+                    f"Tenant {company_id} is already moving ({placement['status']} to "
+                    f"{placement['target_shard']}); abort that move first"
+                )
+            if source_shard == target_shard:
+                raise ValueError(f"Tenant {company_id} already lives on {target_shard}")
+
+            source = self.database(source_shard).users
+            target = self.database(target_shard).users
+            await create_user_indexes(target)
+
+            await self.set_placement(company_id, shard=source_shard, status=STATUS_COPYING,
+                                     target_shard=target_shard, mirror_failures=0)
+            try:
+                log(f"Dual writes enabled for {company_id}; waiting {settle}s for workers to pick it up")
+                await asyncio.sleep(settle)
+                copied, repaired = await self._copy_and_cut_over(company_id, source, target, batch_size, log)
+            except Exception:
+                log(f"Move of {company_id} failed; reads and writes go back to {source_shard} only")
+                await self.abort_move(company_id, log=log)
+                raise
+
+            log(f"Reads switched to {target_shard}; waiting {settle}s")
+            await asyncio.sleep(settle)
+
+        await self.set_placement(company_id, shard=target_shard, status=STATUS_ACTIVE, target_shard=None)
+        log(f"Tenant {company_id} is now active on {target_shard}")
+
+        removed = 0
+        if cleanup:
+            await asyncio.sleep(settle)
+            result = await source.delete_many({"company_id": id_match(company_id)})
+            removed = result.deleted_count
+            log(f"Removed {removed} documents from {source_shard}")
+
+        return {"company_id": company_id, "from": source_shard, "to": target_shard,
+                "copied": copied, "reconciled": repaired, "removed": removed}
+
+    async def _copy_and_cut_over(self, company_id: str, source, target, batch_size: int, log) -> Tuple[int, int]:
+        """Copy and reconcile until the target matches, then switch reads to it"""
+        copied = await _copy_missing(source, target, company_id, batch_size)
+        log(f"Copied {copied} documents")
+        repaired = 0
+        for attempt in range(MAX_RECONCILE_PASSES):
+            failures = await self._mirror_failures(company_id)
+            fixed = await _reconcile(source, target, company_id, batch_size)
+            repaired += fixed
+            log(f"Reconcile pass {attempt + 1}: repaired {fixed} documents")
+            if fixed:
+                continue
+            # Switch reads only if no dual write failed since this clean pass began
+            result = await self.placements.update_one(
+                {"company_id": str(company_id), "status": STATUS_COPYING, "mirror_failures": failures},
+                {"$set": {"status": STATUS_CUTOVER, "updated_at": datetime.now(timezone.utc)}},
+            )
+            self.invalidate(company_id)
+            if result.matched_count:
+                return copied, repaired
+            log("Dual writes to the target failed during reconcile; reconciling again")
+        raise RuntimeError(
+            f"Tenant {company_id} still differs after {MAX_RECONCILE_PASSES} reconcile passes"
+        )
+
+    async def abort_move(self, company_id: str, log=print) -> int:
+        """
+        Stop an unfinished move: the source shard becomes the only copy again
+        and the partial copy on the target is deleted once no worker can still
+        be dual-writing to it. Returns the number of documents removed.
+
+        Only moves that have not switched reads can be aborted; after cutover
+        the target may hold writes the source missed, so finish the move.
+        """
+        self.invalidate(company_id)
+        placement = await self.placement(company_id)
+        if placement["status"] == STATUS_ACTIVE:
+            log(f"Tenant {company_id} is not moving")
+            return 0
+        if placement["status"] == STATUS_CUTOVER:
+            raise RuntimeError(
+                f"Reads for {company_id} already switched to {placement['target_shard']}; "
+                f"run the move again to finish it"
+            )
+
+        target_shard = placement["target_shard"]
+        await self.set_placement(company_id, shard=placement["shard"], status=STATUS_ACTIVE,
+                                 target_shard=None, mirror_failures=0)
+        settle = self.cache_seconds + 1
+        log(f"Move of {company_id} to {target_shard} aborted; waiting {settle}s before removing the partial copy")
+        await asyncio.sleep(settle)
+
+        result = await self.database(target_shard).users.delete_many({"company_id": id_match(company_id)})
+        log(f"Removed {result.deleted_count} documents from {target_shard}")
+        return result.deleted_count
+
+
+async def create_user_indexes(users):
+    """Indexes every users collection needs, on whichever shard it lives"""
+    await users.create_index([("email", 1)], unique=True)
+    await users.create_index([("username", 1), ("company_id", 1)], unique=True)
+    await users.create_index("company_id")  # Critical for tenant isolation
+    await users.create_index([("company_id", 1), ("role", 1)])
+    await users.create_index([("company_id", 1), ("is_active", 1)])
+    await users.create_index([("company_id", 1), ("search_keys", 1)])  # Prefix search
+
+
+async def _copy_missing(source, target, company_id: str, batch_size: int) -> int:
+    """Insert tenant documents the target does not have yet, in _id order"""
+    copied = 0
+    last_id = None
+    while True:
+        query = {"company_id": id_match(company_id)}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await source.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return copied
+        try:
+            result = await target.insert_many(batch, ordered=False)
+            copied += len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Duplicates were already written by dual writes; anything else is fatal
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            copied += e.details["nInserted"]
+        last_id = batch[-1]["_id"]
+
+
+async def _reconcile(source, target, company_id: str, batch_size: int) -> int:
+    """One pass: repair target documents that differ from the source"""
+    repaired = 0
+    last_id = None
+    while True:
+        query = {"company_id": id_match(company_id)}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await source.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return repaired
+        ids = [doc["_id"] for doc in batch]
+        existing = {doc["_id"]: doc async for doc in target.find({"_id": {"$in": ids}})}
+        for doc in batch:
+            if existing.get(doc["_id"]) != doc and await _repair(source, target, doc["_id"]):
+                repaired += 1
+        last_id = ids[-1]
+
+
+async def _repair(source, target, doc_id) -> bool:
+    """
+    Copy one document from source to target without clobbering a dual write.
+
+    The batch snapshot may be stale by now, so re-read both sides (target
+    first) and only replace if the target still holds the version we just
+    read. If a dual write lands in between, the replace matches nothing and
+    we go round again with fresh copies, up to MAX_REPAIR_ATTEMPTS times.
+    """
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        current = await target.find_one({"_id": doc_id})
+        latest = await source.find_one({"_id": doc_id})
+        if latest is None or latest == current:
+            return False
+        if current is None:
+            try:
+                await target.insert_one(latest)
+                return True
+            except DuplicateKeyError:
+                if await target.count_documents({"_id": doc_id}, limit=1):
+                    continue  # a dual write inserted it first
+                raise  # unique conflict with a different document
+        # $literal stops strings like bcrypt hashes ("$2b$...") being read as field paths
+        result = await target.replace_one(
+            {"_id": doc_id, "$expr": {"$eq": ["$$ROOT", {"$literal": current}]}},
+            latest,
+        )
+        if result.matched_count:
+            return True
+    raise RuntimeError(f"Document {doc_id} kept changing during reconcile; gave up after "
+                       f"{MAX_REPAIR_ATTEMPTS} attempts")
@@ -14,6 +14,8 @@ from zoneinfo import ZoneInfo
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 # from src.routes.auth.config import hash_password, create_access_token2,create_access_token,verify_password,get_logged_user
 from src.routes.auth.models import users_collection,User
+from src.database.guard import db_guard
+from src.utils.ids import id_match
 
 from src.utils.config import get_settings
 
@@ -103,11 +105,11 @@ def get_logged_user(request: Request):
 
 async def register_user_service(user: User, status_code=status.HTTP_201_CREATED):
  
-    existing_user = await users_collection.find_one({"username": user.username})
+    existing_user = await db_guard.read(users_collection.find_one, {"username": user.username})
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    existing_email = await users_collection.find_one({"email": user.email})
+    existing_email = await db_guard.read(users_collection.find_one, {"email": user.email})
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -119,12 +121,12 @@ async def register_user_service(user: User, status_code=status.HTTP_201_CREATED)
 
     # 📦 Build user document
     user_dict = user.dict()
-    user_dict["id"] = str(uuid4())
+    user_dict["id"] = uuid4()
     user_dict["password"] = hashed_password
 
 
     # 💾 Insert into DB
-    await users_collection.insert_one(user_dict)
+    await db_guard.write(users_collection.insert_one, user_dict)
 
     return JSONResponse(
         status_code=201,
@@ -206,7 +208,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(b
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
 
-    user = await users_collection.find_one({"id": user_id})
+    user = await db_guard.read(users_collection.find_one, {"id": id_match(user_id)})
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -5,6 +5,8 @@ from uuid import UUID, uuid4
 from datetime import datetime 
 from uuid import uuid4,UUID
 from src.utils.config import get_settings
+from src.utils.monitoring import pool_listener_for
+from src.database.guard import db_guard
 from typing import Optional, List, Literal
 from fastapi import HTTPException, Request
 import pytz
@@ -22,7 +24,13 @@ settings=get_settings()
 # db = client.mobibharatSaaS  # New database for SaaS
 # super_admins_collection = db.super_admins
 
-client = AsyncIOMotorClient(settings.MONGODB_URI)
+client = AsyncIOMotorClient(
+    settings.MONGODB_URI,
+    maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+    uuidRepresentation="standard",
+    event_listeners=[pool_listener_for("auth")],
+)
+db_guard.register(client, "auth")
 db = client.mlg_saas  # New database for SaaS
 users_collection = db.users
 
@@ -52,6 +60,7 @@ class AdminRegister(BaseModel):
     email: EmailStr
     password: str
     admin_token: str
+    company_id: Optional[UUID] = None  # Tenant the admin manages (needed for /users/search)
 
 class UserLogin(BaseModel):
     email: EmailStr
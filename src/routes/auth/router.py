@@ -5,6 +5,7 @@ from src.routes.auth.models import UserRegister,users_collection,User,UserLogin,
 from src.routes.auth.config import hash_password,create_access_token,verify_password,get_current_user,require_role
 from datetime import timedelta
 from src.utils.config import get_settings
+from src.database.guard import db_guard
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -27,7 +28,7 @@ async def register_admin(admin: AdminRegister):
         )
     
     # Check if admin already exists (one-time registration only)
-    existing_admin = await users_collection.find_one({"role": "admin"})
+    existing_admin = await db_guard.read(users_collection.find_one, {"role": "admin"})
     if existing_admin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -35,7 +36,7 @@ async def register_admin(admin: AdminRegister):
         )
     
     # Check if email already exists
-    existing_user = await users_collection.find_one({"email": admin.email})
+    existing_user = await db_guard.read(users_collection.find_one, {"email": admin.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -53,11 +54,12 @@ async def register_admin(admin: AdminRegister):
         is_verified=True
     )
 
-    # Convert to dict with UUIDs as strings
+    # UUIDs are stored as BSON binary (subtype 4)
     admin_dict = new_admin.dict()
-    admin_dict["id"] = str(new_admin.id)
+    if admin.company_id:
+        admin_dict["company_id"] = admin.company_id
 
-    await users_collection.insert_one(admin_dict)
+    await db_guard.write(users_collection.insert_one, admin_dict)
     return {
         "message": "Admin registered successfully",
         "admin_id": str(new_admin.id),
@@ -69,7 +71,7 @@ async def register_admin(admin: AdminRegister):
 @router.post("/register")
 async def register_user(user: UserRegister):
     # Check if email already exists
-    existing_user = await users_collection.find_one({"email": user.email})
+    existing_user = await db_guard.read(users_collection.find_one, {"email": user.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -96,11 +98,10 @@ async def register_user(user: UserRegister):
     password=hashed_password,
 )
 
-# Convert to dict with UUIDs as strings
+    # UUIDs are stored as BSON binary (subtype 4)
     user_dict = new_user.dict()
-    user_dict["id"] = str(new_user.id)
 
-    await users_collection.insert_one(user_dict)
+    await db_guard.write(users_collection.insert_one, user_dict)
     return {
         "message": "User registered successfully",
         "user_id": str(new_user.id),
@@ -112,7 +113,7 @@ async def register_user(user: UserRegister):
 @router.post("/login", response_model=TokenResponse)
 async def login_user(user: UserLogin):
     # Find user by email
-    db_user = await users_collection.find_one({"email": user.email})
+    db_user = await db_guard.read(users_collection.find_one, {"email": user.email})
     if not db_user or not verify_password(user.password, db_user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -122,7 +123,7 @@ async def login_user(user: UserLogin):
     # Generate JWT
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": db_user["id"], "email": db_user["email"]},
+        data={"sub": str(db_user["id"]), "email": db_user["email"]},
         expires_delta=access_token_expires
     )
 
@@ -132,7 +133,7 @@ async def login_user(user: UserLogin):
 @router.get("/me")
 async def read_users_me(current_user: dict = Depends(get_current_user)):
     return {
-        "user_id": current_user["id"],
+        "user_id": str(current_user["id"]),
         "email": current_user["email"],
         "role": current_user["role"]  # fresh from DB
     }
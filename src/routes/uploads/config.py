@@ -0,0 +1,383 @@
+"""
+Upload helpers: streamed multipart parsing, S3 storage, pooled thumbnailing
+and a presigned-URL cache
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import boto3
+from fastapi import HTTPException, Request, status
+from PIL import Image, ImageOps
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from src.utils.config import get_settings
+
+settings = get_settings()
+
+# S3 rejects multipart parts smaller than this (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+AVATAR_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+
+@lru_cache()
+def get_s3_client():
+    if not settings.S3_BUCKET:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="File storage is not configured",
+        )
+    return boto3.client(
+        "s3",
+        endpoint_url=settings.S3_ENDPOINT_URL,
+        region_name=settings.S3_REGION,
+        aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+    )
+
+
+def safe_filename(filename: str) -> str:
+    name = os.path.basename(filename or "").strip()
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    return name[:128] or "file"
+
+
+# ---------------------------------------------------------------------------
+# Streaming upload to S3
+# ---------------------------------------------------------------------------
+
+class S3StreamWriter:
+    """
+    Uploads a stream to S3 in parts of `part_size` bytes, so at most one part
+    is held in memory. Streams smaller than one part use a single put_object.
+    boto3 is blocking, so every call runs in a worker thread.
+    """
+
+    def __init__(self, key: str, content_type: str, part_size: int):
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.size = 0
+        self._upload_id: Optional[str] = None
+        self._parts: List[dict] = []
+
+    def write(self, data: bytes):
+        self.buffer += data
+        self.size += len(data)
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self.buffer) >= self.part_size
+
+    async def flush(self):
+        """Send the buffered bytes as the next multipart part"""
+        s3 = get_s3_client()
+        if self._upload_id is None:
+            response = await asyncio.to_thread(
+                s3.create_multipart_upload,
+                Bucket=settings.S3_BUCKET,
+                Key=self.key,
+                ContentType=self.content_type,
+            )
+            self._upload_id = response["UploadId"]
+
+        part_number = len(self._parts) + 1
+        body = bytes(self.buffer)
+        self.buffer.clear()
+        response = await asyncio.to_thread(
+            s3.upload_part,
+            Bucket=settings.S3_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    async def complete(self):
+        s3 = get_s3_client()
+        if self._upload_id is None:
+            await asyncio.to_thread(
+                s3.put_object,
+                Bucket=settings.S3_BUCKET,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                ContentType=self.content_type,
+            )
+            self.buffer.clear()
+            return
+
+        if self.buffer:
+            await self.flush()
+        await asyncio.to_thread(
+            s3.complete_multipart_upload,
+            Bucket=settings.S3_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    async def abort(self):
+        self.buffer.clear()
+        if self._upload_id is not None:
+            await asyncio.to_thread(
+                get_s3_client().abort_multipart_upload,
+                Bucket=settings.S3_BUCKET,
+                Key=self.key,
+                UploadId=self._upload_id,
+            )
+
+
+class _FilePart:
+    """Collects the headers of the part being parsed"""
+
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self.name: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.content_type = "application/octet-stream"
+
+    def finish_headers(self):
+        _, params = parse_options_header(self.headers.get(b"content-disposition", b""))
+        if b"name" in params:
+            self.name = params[b"name"].decode("utf-8", "replace")
+        if b"filename" in params:
+            self.filename = params[b"filename"].decode("utf-8", "replace")
+        ctype, _ = parse_options_header(self.headers.get(b"content-type", b""))
+        if ctype:
+            self.content_type = ctype.decode("latin-1").lower()
+
+
+async def _discard(writer: Optional[S3StreamWriter], spool_file):
+    """Abort a half-finished upload and drop its spool file"""
+    if writer is not None:
+        await writer.abort()
+    if spool_file is not None:
+        spool_file.close()
+        os.unlink(spool_file.name)
+
+
+async def stream_file_to_s3(request: Request, key_for, max_bytes: int, spool: bool = False,
+                            allowed_types: Optional[set] = None) -> dict:
+    """
+    Parse a multipart body straight off the socket and stream its `file`
+    field to S3. Other fields are ignored.
+
+    `key_for(filename)` builds the object key. With `spool=True` the bytes
+    are also written to a temporary file (returned as `path`) so they can be
+    post-processed without keeping them in memory.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data with a boundary")
+
+    state = {"part": None, "file": None, "writer": None, "done": False, "error": None}
+    spool_file = tempfile.NamedTemporaryFile(delete=False) if spool else None
+    spool_pending: List[bytes] = []
+
+    def on_part_begin():
+        state["part"] = _FilePart()
+
+    def on_header_field(data, start, end):
+        state["part"]._field += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["part"]._value += data[start:end]
+
+    def on_header_end():
+        part = state["part"]
+        part.headers[part._field.lower()] = part._value
+        part._field, part._value = b"", b""
+
+    def on_headers_finished():
+        part = state["part"]
+        part.finish_headers()
+        if part.name != "file" or state["file"] is not None or state["done"]:
+            return
+        if allowed_types is not None and part.content_type not in allowed_types:
+            state["error"] = HTTPException(status_code=415, detail=f"Unsupported file type: {part.content_type}")
+            return
+        state["file"] = part
+        state["writer"] = S3StreamWriter(key_for(safe_filename(part.filename)), part.content_type,
+                                         settings.UPLOAD_PART_SIZE)
+
+    def on_part_data(data, start, end):
+        if state["part"] is not state["file"] or state["done"] or state["error"]:
+            return
+        chunk = data[start:end]
+        writer = state["writer"]
+        if writer.size + len(chunk) > max_bytes:
+            state["error"] = HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
+            return
+        writer.write(chunk)
+        if spool_file is not None:
+            spool_pending.append(chunk)
+
+    def on_part_end():
+        if state["part"] is state["file"]:
+            state["done"] = True
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if state["error"]:
+                raise state["error"]
+            if spool_pending:
+                # Disk writes happen off the event loop, once per request chunk
+                await asyncio.to_thread(spool_file.writelines, list(spool_pending))
+                spool_pending.clear()
+            writer = state["writer"]
+            if writer is not None and writer.needs_flush:
+                await writer.flush()
+        parser.finalize()
+
+        if not state["done"]:
+            raise HTTPException(status_code=400, detail="Missing 'file' field")
+        await state["writer"].complete()
+    except MultipartParseError as e:
+        await _discard(state["writer"], spool_file)
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+    except BaseException:
+        await _discard(state["writer"], spool_file)
+        raise
+
+    if spool_file is not None:
+        spool_file.close()
+
+    part = state["file"]
+    return {
+        "key": state["writer"].key,
+        "filename": safe_filename(part.filename),
+        "content_type": part.content_type,
+        "size": state["writer"].size,
+        "path": spool_file.name if spool_file is not None else None,
+    }
+
+
+async def put_object(key: str, body: bytes, content_type: str):
+    await asyncio.to_thread(
+        get_s3_client().put_object,
+        Bucket=settings.S3_BUCKET,
+        Key=key,
+        Body=body,
+        ContentType=content_type,
+    )
+
+
+async def delete_object(key: str):
+    await asyncio.to_thread(get_s3_client().delete_object, Bucket=settings.S3_BUCKET, Key=key)
+
+
+# ---------------------------------------------------------------------------
+# Thumbnailing in a process pool
+# ---------------------------------------------------------------------------
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        # Not fork: by now the process runs Motor, pymongo monitor and watchdog
+        # threads, and a forked child can inherit one of their locks held
+        _image_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+def make_thumbnails(path: str, sizes: List[int]) -> Dict[int, bytes]:
+    """Runs in a worker process: square-bounded JPEG thumbnails per size"""
+    thumbnails = {}
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=85, optimize=True)
+            thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+async def generate_thumbnails(path: str, sizes: List[int]) -> Dict[int, bytes]:
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_image_pool(), make_thumbnails, path, sizes)
+    except (OSError, Image.DecompressionBombError):
+        # OSError covers UnidentifiedImageError and truncated files
+        raise HTTPException(status_code=422, detail="Could not read image")
+
+
+# ---------------------------------------------------------------------------
+# Presigned URL cache
+# ---------------------------------------------------------------------------
+
+class PresignedUrlCache:
+    """
+    LRU of presigned GET URLs. Entries are reused for half of the URL's
+    lifetime so a cached URL always has plenty of validity left.
+    """
+
+    def __init__(self, expires_seconds: int, max_entries: int):
+        self.expires_seconds = expires_seconds
+        self.max_entries = max_entries
+        self._urls: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> str:
+        now = time.monotonic()
+        cached = self._urls.get(key)
+        if cached and cached[0] > now:
+            self._urls.move_to_end(key)
+            return cached[1]
+
+        url = get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": settings.S3_BUCKET, "Key": key},
+            ExpiresIn=self.expires_seconds,
+        )
+        self._urls[key] = (now + self.expires_seconds / 2, url)
+        self._urls.move_to_end(key)
+        while len(self._urls) > self.max_entries:
+            self._urls.popitem(last=False)
+        return url
+
+    def invalidate(self, key: str):
+        self._urls.pop(key, None)
+
+
+presigned_urls = PresignedUrlCache(
+    expires_seconds=settings.PRESIGNED_URL_EXPIRES_SECONDS,
+    max_entries=settings.PRESIGNED_URL_CACHE_SIZE,
+)
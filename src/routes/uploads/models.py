@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from uuid import UUID, uuid4
+from typing import Dict, Literal, Optional
+from src.routes.auth.models import db, now_ist
+
+uploads_collection = db.uploads
+
+
+class Upload(BaseModel):
+    id: UUID = Field(default_factory=uuid4)
+    user_id: UUID
+    kind: Literal["avatar", "document"]
+    key: str
+    filename: str
+    content_type: str
+    size: int
+    thumbnails: Dict[str, str] = {}   # size in px -> object key
+    created_at: datetime = Field(default_factory=now_ist)
+
+
+class UploadOut(BaseModel):
+    id: UUID
+    kind: str
+    filename: str
+    content_type: str
+    size: int
+    url: str
+    thumbnails: Dict[str, str] = {}   # size in px -> presigned URL
+    created_at: Optional[datetime] = None
@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from uuid import uuid4
+import os
+
+from src.routes.auth.config import get_current_user
+from src.routes.auth.models import users_collection
+from src.routes.uploads.models import Upload, UploadOut, uploads_collection
+from src.routes.uploads.config import (
+    AVATAR_CONTENT_TYPES,
+    delete_object,
+    generate_thumbnails,
+    presigned_urls,
+    put_object,
+    stream_file_to_s3,
+)
+from src.database.guard import db_guard
+from src.utils.config import get_settings
+from src.utils.ids import as_uuid, id_match
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+settings = get_settings()
+
+
+def to_out(upload: dict) -> UploadOut:
+    return UploadOut(
+        id=upload["id"],
+        kind=upload["kind"],
+        filename=upload["filename"],
+        content_type=upload["content_type"],
+        size=upload["size"],
+        url=presigned_urls.get(upload["key"]),
+        thumbnails={size: presigned_urls.get(key) for size, key in upload.get("thumbnails", {}).items()},
+        created_at=upload.get("created_at"),
+    )
+
+
+@router.post("/avatar", response_model=UploadOut, status_code=status.HTTP_201_CREATED)
+async def upload_avatar(request: Request, current_user: dict = Depends(get_current_user)):
+    """Upload a profile picture (multipart field `file`) and build its thumbnails"""
+    upload_id = uuid4()
+    prefix = f"avatars/{current_user['id']}/{upload_id}"
+
+    stored = await stream_file_to_s3(
+        request,
+        key_for=lambda filename: f"{prefix}/{filename}",
+        max_bytes=settings.AVATAR_MAX_BYTES,
+        spool=True,
+        allowed_types=AVATAR_CONTENT_TYPES,
+    )
+
+    # Pillow runs in the process pool; only the spooled file path crosses over
+    thumbnails = {}
+    try:
+        images = await generate_thumbnails(stored["path"], settings.THUMBNAIL_SIZES)
+        for size, body in images.items():
+            key = f"{prefix}/thumb_{size}.jpg"
+            await put_object(key, body, "image/jpeg")
+            thumbnails[str(size)] = key
+    except Exception:
+        # Don't leave an avatar without thumbnails (or orphaned thumbnails) behind
+        for key in [stored["key"], *thumbnails.values()]:
+            await delete_object(key)
+        raise
+    finally:
+        os.unlink(stored["path"])
+
+    upload = Upload(
+        id=upload_id,
+        user_id=as_uuid(current_user["id"]),
+        kind="avatar",
+        key=stored["key"],
+        filename=stored["filename"],
+        content_type=stored["content_type"],
+        size=stored["size"],
+        thumbnails=thumbnails,
+    ).dict()
+    await db_guard.write(uploads_collection.insert_one, upload)
+    await db_guard.write(
+        users_collection.update_one,
+        {"_id": current_user["_id"]},
+        {"$set": {"avatar_upload_id": upload_id}},
+    )
+    return to_out(upload)
+
+
+@router.post("/documents", response_model=UploadOut, status_code=status.HTTP_201_CREATED)
+async def upload_document(request: Request, current_user: dict = Depends(get_current_user)):
+    """Upload a document (multipart field `file`), streamed to storage in parts"""
+    upload_id = uuid4()
+    stored = await stream_file_to_s3(
+        request,
+        key_for=lambda filename: f"documents/{current_user['id']}/{upload_id}/{filename}",
+        max_bytes=settings.UPLOAD_MAX_BYTES,
+    )
+
+    upload = Upload(
+        id=upload_id,
+        user_id=as_uuid(current_user["id"]),
+        kind="document",
+        key=stored["key"],
+        filename=stored["filename"],
+        content_type=stored["content_type"],
+        size=stored["size"],
+    ).dict()
+    await db_guard.write(uploads_collection.insert_one, upload)
+    return to_out(upload)
+
+
+@router.get("/{upload_id}", response_model=UploadOut)
+async def get_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Get an upload with presigned read URLs (served from cache)"""
+    upload = await db_guard.read(
+        uploads_collection.find_one,
+        {"id": id_match(upload_id), "user_id": id_match(current_user["id"])},
+    )
+    if not upload:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return to_out(upload)
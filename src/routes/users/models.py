@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from uuid import UUID
+from typing import List, Optional
+
+
+# Tenant documents come from CompanyDatabase.create_user, which takes any
+# dict, so everything but the id is optional
+class UserSearchHit(BaseModel):
+    id: UUID
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    role: Optional[str] = None
+
+
+class UserSearchResponse(BaseModel):
+    query: str
+    results: List[UserSearchHit]
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from src.routes.auth.config import require_role
+from src.routes.users.models import UserSearchResponse
+from src.database.connection import CompanyDatabase
+from src.database.search import MAX_QUERY_LENGTH
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+
+@router.get("/search", response_model=UserSearchResponse)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_LENGTH, description="Name or email prefix"),
+    limit: int = Query(10, ge=1, le=50),
+    admin=Depends(require_role("admin")),
+):
+    """
+    Autocomplete users in the admin's company by name or email prefix.
+    The company is the admin's company_id, set at /auth/admin-register.
+    """
+    company_id = admin.get("company_id")
+    if not company_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Admin is not assigned to a company; register the admin with a company_id"
+        )
+
+    results = await CompanyDatabase(company_id).search_users(q, limit=limit)
+    return {"query": q, "results": results}
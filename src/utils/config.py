@@ -6,7 +6,7 @@ from pydantic import (
     computed_field,
     field_validator
 )
-from typing import List
+from typing import Dict, List
 
 
 
@@ -23,6 +23,36 @@ class Settings(BaseSettings):
     API_VERSION: str
     PORT: int
     ALLOWED_ADMIN_EMAILS: str = ""
+    MONGODB_MAX_POOL_SIZE: int = 100
+    HEALTH_PING_TIMEOUT_SECONDS: float = 2.0
+    LOOP_LAG_SAMPLE_INTERVAL_MS: int = 500
+    LOOP_LAG_DEGRADED_MS: int = 100
+    LOOP_BLOCK_THRESHOLD_MS: int = 200
+    LOOP_BLOCK_DEBUG: bool = False
+    # Extra tenant shards as JSON: {"shard-name": "mongodb://host/db_name"}
+    TENANT_SHARDS: Dict[str, str] = {}
+    TENANT_PLACEMENT_CACHE_SECONDS: int = 30
+    DB_READ_TIMEOUT_MS: int = 2000
+    DB_WRITE_TIMEOUT_MS: int = 5000
+    DB_BREAKER_FAILURE_THRESHOLD: int = 5
+    DB_BREAKER_RESET_SECONDS: float = 10.0
+    # S3-compatible storage; set S3_ENDPOINT_URL for MinIO or a local stand-in
+    S3_BUCKET: str | None = None
+    S3_ENDPOINT_URL: str | None = None
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    AVATAR_MAX_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024
+    THUMBNAIL_SIZES: List[int] = [64, 256]
+    IMAGE_WORKERS: int = 2
+    PRESIGNED_URL_EXPIRES_SECONDS: int = 3600
+    PRESIGNED_URL_CACHE_SIZE: int = 10000
+    # Also match legacy string ids; turn off once migrate_uuids has finished
+    UUID_LEGACY_STRING_READS: bool = True
+    USER_SEARCH_CACHE_SECONDS: float = 5.0
+    USER_SEARCH_CACHE_SIZE: int = 10000
 
     @computed_field
     @property
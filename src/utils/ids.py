@@ -0,0 +1,33 @@
+"""
+Helpers for ids stored as BSON binary UUIDs (subtype 4)
+"""
+from uuid import UUID
+from typing import Any
+
+from src.utils.config import get_settings
+
+settings = get_settings()
+
+
+def as_uuid(value: Any) -> Any:
+    """Convert a UUID-looking value to uuid.UUID; leave anything else alone"""
+    if isinstance(value, UUID) or value is None:
+        return value
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return value
+
+
+def id_match(value: Any) -> Any:
+    """
+    Query value matching an id in either storage format.
+
+    Documents written before the binary UUID migration hold the 36-character
+    string form, so until UUID_LEGACY_STRING_READS is turned off both forms
+    are matched (two point lookups on the same index).
+    """
+    converted = as_uuid(value)
+    if not isinstance(converted, UUID) or not settings.UUID_LEGACY_STRING_READS:
+        return converted
+    return {"$in": [converted, str(converted)]}
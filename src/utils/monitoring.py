@@ -0,0 +1,243 @@
+"""
+Runtime monitoring: MongoDB connection pool usage and event-loop lag
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+from src.utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PoolUsageListener(monitoring.ConnectionPoolListener):
+    """Tracks open, checked-out and waiting connections per server for one client"""
+
+    def __init__(self, label: str, max_pool_size: int):
+        self.label = label
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._open: Dict[str, int] = defaultdict(int)
+        self._checked_out: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def _key(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _bump(self, counter: Dict[str, int], event, delta: int):
+        with self._lock:
+            key = self._key(event)
+            counter[key] = max(counter[key] + delta, 0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            key = self._key(event)
+            for counter in (self._open, self._checked_out, self._waiting):
+                counter.pop(key, None)
+
+    def connection_created(self, event):
+        self._bump(self._open, event, 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(self._open, event, -1)
+
+    def connection_check_out_started(self, event):
+        self._bump(self._waiting, event, 1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(self._waiting, event, -1)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            key = self._key(event)
+            self._waiting[key] = max(self._waiting[key] - 1, 0)
+            self._checked_out[key] += 1
+
+    def connection_checked_in(self, event):
+        self._bump(self._checked_out, event, -1)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-server pool usage; saturation is checked-out / maxPoolSize"""
+        max_pool_size = self.max_pool_size
+        with self._lock:
+            servers = set(self._open) | set(self._checked_out) | set(self._waiting)
+            return {
+                server: {
+                    "open": self._open[server],
+                    "checked_out": self._checked_out[server],
+                    "waiting": self._waiting[server],
+                    "max_pool_size": max_pool_size,
+                    "saturation": round(self._checked_out[server] / max_pool_size, 3) if max_pool_size else None,
+                }
+                for server in sorted(servers)
+            }
+
+
+# One listener per Motor client: several clients may share a server, and
+# each has its own pool and maxPoolSize
+pool_listeners: Dict[str, PoolUsageListener] = {}
+
+
+def pool_listener_for(label: str) -> PoolUsageListener:
+    """Listener to pass in a client's event_listeners"""
+    listener = pool_listeners.get(label)
+    if listener is None:
+        listener = PoolUsageListener(label, settings.MONGODB_MAX_POOL_SIZE)
+        pool_listeners[label] = listener
+    return listener
+
+
+def pool_snapshot() -> Dict[str, Dict[str, dict]]:
+    return {label: listener.snapshot() for label, listener in pool_listeners.items()}
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag by measuring how late a periodic sleep wakes up.
+
+    When block detection is enabled, a heartbeat task ticks every quarter of
+    the threshold and a watchdog thread grabs the loop thread's stack once the
+    heartbeat is overdue by more than the threshold. When the loop comes back
+    the stall is logged with its measured length and that stack, which points
+    straight at sync calls made inside coroutines.
+    """
+
+    def __init__(self, interval: float, block_threshold: float, detect_blocking: bool = False):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.detect_blocking = detect_blocking
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.avg_lag = 0.0
+        self.samples = 0
+        self.blocked_events = 0
+        self.beat = block_threshold / 4
+        self._last_beat = time.monotonic()
+        self._stall_stack: Optional[tuple] = None
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+
+    async def _sample(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - start - self.interval, 0.0)
+            self.samples += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            # Exponential moving average so old spikes fade out
+            self.avg_lag = lag if self.samples == 1 else 0.9 * self.avg_lag + 0.1 * lag
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.beat)
+            beat = self._last_beat
+            stalled = time.monotonic() - beat
+            if stalled <= self.block_threshold:
+                continue
+            self.blocked_events += 1
+            captured = self._stall_stack
+            stack = captured[1] if captured and captured[0] == beat else "<block ended before the stack was sampled>"
+            # The block started somewhere within one beat of the last tick
+            logger.warning(
+                "Event loop blocked for %.0f-%.0f ms (threshold %.0f ms)\n%s",
+                max(stalled - self.beat, 0) * 1000,
+                stalled * 1000,
+                self.block_threshold * 1000,
+                stack,
+            )
+
+    def _watch(self):
+        # Runs in its own thread: sample the loop thread's stack while it is
+        # still stuck, once per overdue heartbeat
+        while not self._stop.wait(self.beat / 2):
+            beat = self._last_beat
+            if time.monotonic() - beat <= self.block_threshold:
+                continue
+            if self._stall_stack and self._stall_stack[0] == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>"
+            self._stall_stack = (beat, stack)
+
+    def start(self):
+        """Start sampling on the running loop (and the watchdog, if enabled)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        if self.detect_blocking:
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-block-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        """Stop sampling and the watchdog thread"""
+        self._stop.set()
+        for task in (self._task, self._heartbeat_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._heartbeat_task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def snapshot(self) -> dict:
+        return {
+            "last_ms": round(self.last_lag * 1000, 2),
+            "avg_ms": round(self.avg_lag * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "samples": self.samples,
+            "blocked_events": self.blocked_events,
+            "block_detection": self.detect_blocking,
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_SAMPLE_INTERVAL_MS / 1000,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+    detect_blocking=settings.LOOP_BLOCK_DEBUG,
+)
+
+
+async def ping_client(client, timeout: float) -> dict:
+    """Ping a Motor client, returning status and round-trip time"""
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=timeout)
+    except Exception as e:
+        return {"status": "down", "error": str(e) or e.__class__.__name__}
+    return {"status": "up", "latency_ms": round((time.monotonic() - start) * 1000, 2)}
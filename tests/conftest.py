@@ -0,0 +1,21 @@
+import os
+import sys
+
+# Settings are read once at import time; give the app a complete, offline config
+os.environ.setdefault("PROJECT_NAME", "mlg-test")
+os.environ.setdefault("debug", "false")
+os.environ.setdefault("secret_key", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("ENCRYPTION_ALGORITHM", "HS256")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("API_VERSION", "v1")
+os.environ.setdefault("PORT", "8000")
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+
+# Credentials for the moto S3 stand-in
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import AutoReconnect
+
+from src.database import guard as guard_module
+from src.database.guard import CircuitBreaker, CircuitOpenError, DatabaseGuard, DatabaseTimeout
+
+
+def make_guard(failure_threshold=2, reset_seconds=10.0) -> DatabaseGuard:
+    return DatabaseGuard(read_timeout=0.02, write_timeout=0.02,
+                         failure_threshold=failure_threshold, reset_seconds=reset_seconds)
+
+
+async def slow():
+    await asyncio.sleep(1)
+
+
+async def ok():
+    return "ok"
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_timeout(breaker.admit())
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_opens_after_consecutive_timeouts_and_sheds_calls():
+    guard = make_guard()
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(DatabaseTimeout):
+                await guard.read(slow)
+        with pytest.raises(CircuitOpenError) as exc:
+            await guard.read(ok)
+        return exc.value
+
+    rejected = asyncio.run(run())
+    assert rejected.retry_after == 10
+    snapshot = guard.snapshot()["clients"]["other"]
+    assert snapshot["breaker_state"] == CircuitBreaker.OPEN
+    assert snapshot["timeouts"]["read"] == 2
+    assert snapshot["rejected"] == 1
+    assert guard.is_degraded()
+
+
+def test_success_resets_the_timeout_streak():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    breaker.record_timeout(breaker.admit())
+    breaker.record_success(breaker.admit())
+    breaker.record_timeout(breaker.admit())
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_after_counts_down_the_reset_window(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    open_breaker(breaker)
+
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now + 7.5)
+    assert breaker.admit() is None
+    assert breaker.retry_after() == 3
+
+
+def test_only_the_half_open_trial_closes_the_breaker(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    open_breaker(breaker)
+
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now + 10)
+    trial = breaker.admit()
+    assert trial is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.admit() is None  # one trial at a time
+
+    breaker.record_success(False)  # a straggler, not the trial
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_success(trial)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.admit() is False
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    open_breaker(breaker)
+
+    monkeypatch.setattr(guard_module.time, "monotonic", lambda: now + 10)
+    breaker.record_timeout(breaker.admit())
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    assert breaker.admit() is None
+
+
+def test_late_success_does_not_close_an_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    early = breaker.admit()  # admitted while closed, finishes after the breaker opened
+    open_breaker(breaker)
+
+    breaker.record_success(early)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.admit() is None
+
+
+def test_non_timeout_error_frees_the_trial_slot():
+    guard = make_guard(failure_threshold=1, reset_seconds=0.05)
+
+    async def unreachable():
+        raise AutoReconnect("connection refused")
+
+    async def run():
+        with pytest.raises(DatabaseTimeout):
+            await guard.write(slow)
+        await asyncio.sleep(0.06)
+        with pytest.raises(AutoReconnect):
+            await guard.write(unreachable)  # the trial, failing without a timeout
+        assert guard._fallback.breaker.state == CircuitBreaker.HALF_OPEN
+        return await guard.write(ok)  # a new trial is admitted and closes it
+
+    assert asyncio.run(run()) == "ok"
+    assert guard._fallback.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_each_registered_client_has_its_own_breaker():
+    guard = make_guard(failure_threshold=1)
+    clients = [AsyncIOMotorClient(f"mongodb://localhost:{port}", connect=False) for port in (27018, 27019)]
+    try:
+        a, b = clients
+        guard.register(a, "a")
+        guard.register(b, "b")
+
+        assert guard._guard_for(a.db.users.find_one).label == "a"
+        assert guard._guard_for(a.db.users.find().to_list).label == "a"
+        assert guard._guard_for(b.db.users.aggregate([]).to_list).label == "b"
+        assert guard._guard_for(ok).label == "other"
+
+        open_breaker(guard._guard_for(a.db.users.find_one).breaker)
+
+        with pytest.raises(CircuitOpenError, match="for a open"):
+            asyncio.run(guard.read(a.db.users.find_one, {}))
+        states = {label: client["breaker_state"] for label, client in guard.snapshot()["clients"].items()}
+        assert states == {"a": CircuitBreaker.OPEN, "b": CircuitBreaker.CLOSED, "other": CircuitBreaker.CLOSED}
+    finally:
+        for client in clients:
+            client.close()
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from src.utils.monitoring import LoopLagMonitor, PoolUsageListener, ping_client, pool_listener_for, pool_snapshot
+
+SERVER = SimpleNamespace(address=("db1", 27017))
+
+
+def blocking_section(seconds):
+    time.sleep(seconds)
+
+
+def test_loop_blocks_past_the_threshold_are_logged_with_their_stack(caplog):
+    monitor = LoopLagMonitor(interval=0.05, block_threshold=0.2, detect_blocking=True)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_section(0.5)
+        await asyncio.sleep(0.2)  # let the heartbeat notice and log
+        blocking_section(0.1)  # under the threshold
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="src.utils.monitoring"):
+        asyncio.run(run())
+
+    assert monitor.blocked_events == 1
+    assert monitor.max_lag >= 0.4
+    [record] = [r for r in caplog.records if "Event loop blocked" in r.getMessage()]
+    message = record.getMessage()
+    low, high = (float(ms) for ms in message.split("blocked for ")[1].split(" ms")[0].split("-"))
+    assert low <= 520 and high >= 500  # time.sleep may overshoot a little
+    assert "blocking_section" in message
+    assert "time.sleep" in message
+
+
+def test_block_detection_is_off_by_default():
+    monitor = LoopLagMonitor(interval=0.05, block_threshold=0.1)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.06)
+        blocking_section(0.3)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert monitor.blocked_events == 0
+    assert monitor.samples >= 1
+    assert monitor.snapshot()["block_detection"] is False
+
+
+def test_pool_listener_tracks_checkouts_and_saturation():
+    listener = PoolUsageListener("test", max_pool_size=4)
+    for _ in range(3):
+        listener.connection_created(SERVER)
+        listener.connection_check_out_started(SERVER)
+        listener.connection_checked_out(SERVER)
+    listener.connection_check_out_started(SERVER)  # still waiting
+
+    usage = listener.snapshot()["db1:27017"]
+    assert usage == {"open": 3, "checked_out": 3, "waiting": 1, "max_pool_size": 4, "saturation": 0.75}
+
+    listener.connection_check_out_failed(SERVER)
+    listener.connection_checked_in(SERVER)
+    listener.connection_closed(SERVER)
+    usage = listener.snapshot()["db1:27017"]
+    assert (usage["open"], usage["checked_out"], usage["waiting"], usage["saturation"]) == (2, 2, 0, 0.5)
+
+    listener.pool_closed(SERVER)
+    assert listener.snapshot() == {}
+
+
+def test_pool_listeners_are_kept_per_client_label():
+    listener = pool_listener_for("test-client")
+
+    assert pool_listener_for("test-client") is listener
+    listener.connection_created(SERVER)
+    assert pool_snapshot()["test-client"]["db1:27017"]["open"] == 1
+
+
+def test_ping_reports_down_when_the_server_does_not_answer():
+    async def hang(command):
+        await asyncio.sleep(1)
+
+    client = SimpleNamespace(admin=SimpleNamespace(command=hang))
+    result = asyncio.run(ping_client(client, timeout=0.05))
+
+    assert result["status"] == "down"
@@ -0,0 +1,424 @@
+import asyncio
+import copy
+import itertools
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, OperationFailure
+
+from src.database import connection, sharding
+from src.database.sharding import (
+    DEFAULT_SHARD,
+    STATUS_ACTIVE,
+    STATUS_COPYING,
+    STATUS_CUTOVER,
+    TenantRouter,
+    _repair,
+)
+
+BCRYPT_HASH = "$2b$12$Q1i8b2C3d4E5f6G7h8I9jOKLmnopqRSTuvwxYZ0123456789abcde"
+
+_ids = itertools.count(1)
+
+
+def _evaluate(expr, doc):
+    """The slice of the aggregation language _repair uses"""
+    if isinstance(expr, str) and expr.startswith("$"):
+        if expr == "$$ROOT":
+            return doc
+        path = expr[1:]
+        if "$" in path:
+            raise OperationFailure(f"FieldPath field names may not contain '$': {expr}")
+        return doc.get(path)
+    if isinstance(expr, dict):
+        if set(expr) == {"$literal"}:
+            return expr["$literal"]
+        if set(expr) == {"$eq"}:
+            left, right = expr["$eq"]
+            return _evaluate(left, doc) == _evaluate(right, doc)
+        return {key: _evaluate(value, doc) for key, value in expr.items()}
+    if isinstance(expr, list):
+        return [_evaluate(value, doc) for value in expr]
+    return expr
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$expr":
+            if not _evaluate(cond, doc):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict) and cond and all(op.startswith("$") for op in cond):
+            for op, arg in cond.items():
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length]
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self.docs:
+                yield doc
+        return gen()
+
+
+class FakeCollection:
+    """In-memory stand-in for the Motor collection methods the router uses"""
+
+    def __init__(self, name: str, fail_writes: Exception = None):
+        self.name = name
+        self.full_name = name
+        self.fail_writes = fail_writes
+        self.docs = {}
+
+    def _check(self):
+        if self.fail_writes is not None:
+            raise self.fail_writes
+
+    def _matching(self, query):
+        return [doc for doc in self.docs.values() if _matches(doc, query or {})]
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self._matching(query)])
+
+    async def find_one(self, query=None, projection=None):
+        found = self._matching(query)
+        if not found:
+            return None
+        doc = copy.deepcopy(found[0])
+        if projection and not any(projection.values()):
+            return {k: v for k, v in doc.items() if k not in projection}
+        if projection:
+            return {k: v for k, v in doc.items() if k in projection or k == "_id"}
+        return doc
+
+    async def insert_one(self, doc):
+        self._check()
+        doc.setdefault("_id", next(_ids))
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs, ordered=True):
+        self._check()
+        inserted, errors = [], []
+        for doc in docs:
+            if doc["_id"] in self.docs:
+                errors.append({"code": 11000, "op": doc})
+                continue
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+            inserted.append(doc["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    async def replace_one(self, query, doc):
+        self._check()
+        found = self._matching(query)
+        if found:
+            self.docs[found[0]["_id"]] = {**copy.deepcopy(doc), "_id": found[0]["_id"]}
+        return SimpleNamespace(matched_count=len(found[:1]))
+
+    async def update_one(self, query, update, upsert=False):
+        self._check()
+        found = self._matching(query)
+        if not found and not upsert:
+            return SimpleNamespace(matched_count=0)
+        if found:
+            doc = found[0]
+        else:
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc["_id"] = next(_ids)
+            self.docs[doc["_id"]] = doc
+        doc.update(copy.deepcopy(update.get("$set", {})))
+        for key, delta in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + delta
+        return SimpleNamespace(matched_count=len(found[:1]))
+
+    async def delete_many(self, query):
+        found = self._matching(query)
+        for doc in found:
+            del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(found))
+
+    async def count_documents(self, query, limit=0):
+        found = len(self._matching(query))
+        return min(found, limit) if limit else found
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(f"{self.name}.{name}")
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class FakeClient:
+    def __init__(self, db):
+        self.db = db
+
+    def get_default_database(self, default=None):
+        return self.db
+
+
+@pytest.fixture(autouse=True)
+def no_settle_wait(monkeypatch):
+    """Moves wait a placement-cache TTL between steps; skip that here"""
+    async def no_sleep(seconds):
+        pass
+    monkeypatch.setattr(sharding.asyncio, "sleep", no_sleep)
+
+
+@pytest.fixture
+def shards():
+    return {DEFAULT_SHARD: FakeDatabase("default"), "s2": FakeDatabase("s2")}
+
+
+def make_router(shards, cache_seconds=0) -> TenantRouter:
+    router = TenantRouter(shards[DEFAULT_SHARD], shards={"s2": "mongodb://s2"}, cache_seconds=cache_seconds)
+    router._clients["mongodb://s2"] = FakeClient(shards["s2"])
+    return router
+
+
+def seed_users(collection, company_id, count=3):
+    for n in range(count):
+        collection.docs[n + 1] = {
+            "_id": n + 1,
+            "id": uuid4(),
+            "company_id": company_id,
+            "email": f"user{n}@example.com",
+            "password": BCRYPT_HASH,
+        }
+
+
+def tenant_docs(collection, company_id):
+    return sorted(doc["_id"] for doc in collection.docs.values() if doc["company_id"] == company_id)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_routing_follows_placement_state(shards):
+    router = make_router(shards)
+    company = str(uuid4())
+    default_users, s2_users = shards[DEFAULT_SHARD].users, shards["s2"].users
+
+    assert run(router.collection(company)) is default_users
+    assert run(router.write_collections(company)) == [default_users]
+
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_COPYING, target_shard="s2"))
+    assert run(router.collection(company)) is default_users
+    assert run(router.write_collections(company)) == [default_users, s2_users]
+
+    run(router.set_placement(company, status=STATUS_CUTOVER))
+    assert run(router.collection(company)) is s2_users
+    assert run(router.write_collections(company)) == [s2_users, default_users]
+
+
+def test_move_copies_tenant_and_switches_placement(shards):
+    router = make_router(shards)
+    company, other = uuid4(), uuid4()
+    source = shards[DEFAULT_SHARD].users
+    seed_users(source, company)
+    source.docs[99] = {"_id": 99, "company_id": other, "password": BCRYPT_HASH}
+    # A stale copy on the target (e.g. an earlier dual write) must be repaired
+    shards["s2"].users.docs[1] = {**source.docs[1], "email": "old@example.com"}
+
+    summary = run(router.move_tenant(str(company), "s2", cleanup=True, log=lambda msg: None))
+
+    assert summary["copied"] == 2
+    assert summary["reconciled"] == 1
+    assert summary["removed"] == 3
+    assert shards["s2"].users.docs[1]["email"] == "user0@example.com"
+    assert tenant_docs(shards["s2"].users, company) == [1, 2, 3]
+    assert tenant_docs(source, company) == []
+    assert 99 in source.docs
+    placement = run(router.placement(str(company)))
+    assert (placement["shard"], placement["status"], placement["target_shard"]) == ("s2", STATUS_ACTIVE, None)
+
+
+def test_mirror_failure_during_reconcile_forces_another_pass(shards, monkeypatch):
+    router = make_router(shards)
+    company = uuid4()
+    seed_users(shards[DEFAULT_SHARD].users, company)
+    reconcile = sharding._reconcile
+    passes = []
+
+    async def racing_reconcile(source, target, company_id, batch_size):
+        passes.append(1)
+        if len(passes) == 1:
+            assert await router.record_mirror_failure(company_id)
+        return await reconcile(source, target, company_id, batch_size)
+
+    monkeypatch.setattr(sharding, "_reconcile", racing_reconcile)
+    run(router.move_tenant(str(company), "s2", log=lambda msg: None))
+
+    assert len(passes) == 2
+    assert run(router.placement(str(company)))["shard"] == "s2"
+
+
+def test_failed_reconcile_aborts_the_move(shards, monkeypatch):
+    router = make_router(shards)
+    company = uuid4()
+    seed_users(shards[DEFAULT_SHARD].users, company)
+
+    async def never_converges(source, target, company_id, batch_size):
+        return 1
+
+    monkeypatch.setattr(sharding, "_reconcile", never_converges)
+    with pytest.raises(RuntimeError, match="reconcile passes"):
+        run(router.move_tenant(str(company), "s2", log=lambda msg: None))
+
+    placement = run(router.placement(str(company)))
+    assert (placement["shard"], placement["status"], placement["target_shard"]) == (DEFAULT_SHARD, STATUS_ACTIVE, None)
+    assert tenant_docs(shards["s2"].users, company) == []
+    assert tenant_docs(shards[DEFAULT_SHARD].users, company) == [1, 2, 3]
+
+
+def test_second_move_is_refused_until_aborted(shards):
+    router = make_router(shards)
+    company = uuid4()
+    seed_users(shards[DEFAULT_SHARD].users, company)
+    shards["s2"].users.docs[1] = dict(shards[DEFAULT_SHARD].users.docs[1])
+    run(router.set_placement(str(company), shard=DEFAULT_SHARD, status=STATUS_COPYING, target_shard="s2"))
+
+    with pytest.raises(RuntimeError, match="already moving"):
+        run(router.move_tenant(str(company), "s2", log=lambda msg: None))
+
+    assert run(router.abort_move(str(company), log=lambda msg: None)) == 1
+    placement = run(router.placement(str(company)))
+    assert (placement["shard"], placement["status"], placement["target_shard"]) == (DEFAULT_SHARD, STATUS_ACTIVE, None)
+    assert tenant_docs(shards["s2"].users, company) == []
+
+
+def test_move_stopped_after_cutover_is_finished_not_aborted(shards):
+    router = make_router(shards)
+    company = str(uuid4())
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_CUTOVER, target_shard="s2"))
+
+    with pytest.raises(RuntimeError, match="run the move again"):
+        run(router.abort_move(company, log=lambda msg: None))
+
+    run(router.move_tenant(company, "s2", log=lambda msg: None))
+    placement = run(router.placement(company))
+    assert (placement["shard"], placement["status"]) == ("s2", STATUS_ACTIVE)
+
+
+def test_repair_matches_documents_holding_dollar_strings():
+    source, target = FakeCollection("source"), FakeCollection("target")
+    source.docs[1] = {"_id": 1, "email": "new@example.com", "password": BCRYPT_HASH}
+    target.docs[1] = {"_id": 1, "email": "old@example.com", "password": BCRYPT_HASH}
+
+    assert run(_repair(source, target, 1)) is True
+    assert target.docs[1] == source.docs[1]
+
+
+def test_repair_inserts_missing_documents_and_skips_equal_ones():
+    source, target = FakeCollection("source"), FakeCollection("target")
+    source.docs[1] = {"_id": 1, "password": BCRYPT_HASH}
+
+    assert run(_repair(source, target, 1)) is True
+    assert run(_repair(source, target, 1)) is False
+    assert target.docs[1] == source.docs[1]
+
+
+def test_repair_gives_up_when_the_target_keeps_changing():
+    source, target = FakeCollection("source"), FakeCollection("target")
+    source.docs[1] = {"_id": 1, "email": "new@example.com"}
+    target.docs[1] = {"_id": 1, "email": "old@example.com"}
+
+    async def raced(query, doc):
+        return SimpleNamespace(matched_count=0)  # a dual write always lands first
+
+    target.replace_one = raced
+    with pytest.raises(RuntimeError, match="kept changing"):
+        run(_repair(source, target, 1))
+
+
+@pytest.fixture
+def company_db(shards, monkeypatch):
+    """CompanyDatabase routed through a fake router, placement cached for 30s"""
+    router = make_router(shards, cache_seconds=30)
+    monkeypatch.setattr(connection, "tenant_router", router)
+    company = str(uuid4())
+    return router, company, connection.CompanyDatabase(company)
+
+
+def test_failed_mirror_write_while_copying_is_recorded(shards, company_db):
+    router, company, db = company_db
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_COPYING,
+                             target_shard="s2", mirror_failures=0))
+    shards["s2"].users.fail_writes = AutoReconnect("s2 primary stepped down")
+
+    run(db._write("insert_one", {"_id": 1, "company_id": company}))
+
+    assert 1 in shards[DEFAULT_SHARD].users.docs
+    assert run(router._mirror_failures(company)) == 1
+
+
+def test_failed_mirror_write_after_reads_switched_fails_the_request(shards, company_db):
+    router, company, db = company_db
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_COPYING, target_shard="s2"))
+    run(router.placement(company))  # this worker still has "copying" cached
+    run(shards[DEFAULT_SHARD].tenant_placements.update_one(
+        {"company_id": company}, {"$set": {"status": STATUS_CUTOVER}}))
+    shards["s2"].users.fail_writes = AutoReconnect("s2 primary stepped down")
+
+    with pytest.raises(AutoReconnect):
+        run(db._write("insert_one", {"_id": 1, "company_id": company}))
+
+
+def test_failed_write_to_retiring_source_is_only_logged(shards, company_db):
+    router, company, db = company_db
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_CUTOVER, target_shard="s2"))
+    shards[DEFAULT_SHARD].users.fail_writes = AutoReconnect("old primary gone")
+
+    run(db._write("insert_one", {"_id": 1, "company_id": company}))
+
+    assert 1 in shards["s2"].users.docs
+
+
+def test_duplicate_on_mirror_is_ignored(shards, company_db):
+    router, company, db = company_db
+    run(router.set_placement(company, shard=DEFAULT_SHARD, status=STATUS_COPYING,
+                             target_shard="s2", mirror_failures=0))
+    shards["s2"].users.docs[1] = {"_id": 1, "company_id": company}
+
+    run(db._write("insert_one", {"_id": 1, "company_id": company}))
+
+    assert run(router._mirror_failures(company)) == 0
@@ -0,0 +1,251 @@
+import asyncio
+import io
+import os
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from moto import mock_aws
+from PIL import Image
+from starlette.requests import ClientDisconnect, Request
+
+from src.routes.uploads import config as uploads
+from src.routes.uploads.config import (
+    PresignedUrlCache,
+    generate_thumbnails,
+    get_s3_client,
+    make_thumbnails,
+    shutdown_image_pool,
+    stream_file_to_s3,
+)
+
+BUCKET = "test-bucket"
+BOUNDARY = "testboundary"
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def s3():
+    """Local S3 stand-in (moto) with an empty bucket"""
+    with mock_aws():
+        get_s3_client.cache_clear()
+        client = get_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    get_s3_client.cache_clear()
+
+
+def multipart_body(payload: bytes, content_type: str = "application/pdf", filename: str = "report.pdf") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\n'
+        f"ignored\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, chunk_size: int = 256 * 1024, disconnect_after: int = None) -> Request:
+    """A Request whose body arrives in chunks, like a real socket"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    if disconnect_after is not None:
+        chunks = chunks[:disconnect_after]
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1 or disconnect_after is not None}
+        for i, chunk in enumerate(chunks)
+    ]
+    if disconnect_after is not None:
+        messages.append({"type": "http.disconnect"})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/uploads/documents",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive)
+
+
+def upload(request: Request, **kwargs) -> dict:
+    kwargs.setdefault("max_bytes", 50 * MiB)
+    return asyncio.run(stream_file_to_s3(request, key_for=lambda name: f"documents/test/{name}", **kwargs))
+
+
+def no_pending_uploads(s3) -> bool:
+    return not s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def jpeg_bytes(size=(800, 600)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_small_file_is_stored_with_single_put(s3):
+    payload = b"%PDF-1.4 small"
+    stored = upload(make_request(multipart_body(payload)))
+
+    assert stored["key"] == "documents/test/report.pdf"
+    assert stored["size"] == len(payload)
+    obj = s3.get_object(Bucket=BUCKET, Key=stored["key"])
+    assert obj["Body"].read() == payload
+    assert obj["ContentType"] == "application/pdf"
+    assert "-" not in obj["ETag"]  # not a multipart upload
+
+
+def test_large_file_is_streamed_as_multipart_upload(s3):
+    payload = os.urandom(11 * MiB)
+    stored = upload(make_request(multipart_body(payload)))
+
+    obj = s3.get_object(Bucket=BUCKET, Key=stored["key"])
+    assert obj["Body"].read() == payload
+    assert obj["ETag"].strip('"').endswith("-2")  # 8 MiB part + 3 MiB tail
+    assert no_pending_uploads(s3)
+
+
+def test_oversized_file_is_rejected_and_multipart_upload_aborted(s3):
+    payload = os.urandom(11 * MiB)
+    with pytest.raises(HTTPException) as exc:
+        upload(make_request(multipart_body(payload)), max_bytes=9 * MiB)
+
+    assert exc.value.status_code == 413
+    assert no_pending_uploads(s3)
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+
+def test_disallowed_content_type_is_rejected(s3):
+    body = multipart_body(b"hello", content_type="text/plain", filename="notes.txt")
+    with pytest.raises(HTTPException) as exc:
+        upload(make_request(body), allowed_types=uploads.AVATAR_CONTENT_TYPES)
+
+    assert exc.value.status_code == 415
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+
+def test_client_disconnect_aborts_multipart_upload(s3):
+    payload = os.urandom(11 * MiB)
+    with pytest.raises(ClientDisconnect):
+        upload(make_request(multipart_body(payload), disconnect_after=40))  # ~10 MiB sent
+
+    assert no_pending_uploads(s3)
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+
+def test_malformed_body_is_a_bad_request(s3):
+    with pytest.raises(HTTPException) as exc:
+        upload(make_request(b"this is not multipart at all"))
+
+    assert exc.value.status_code == 400
+
+
+def test_missing_file_field_is_a_bad_request(s3):
+    body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="note"\r\n\r\nhi\r\n--{BOUNDARY}--\r\n'.encode()
+    with pytest.raises(HTTPException) as exc:
+        upload(make_request(body))
+
+    assert exc.value.status_code == 400
+
+
+def test_spooled_copy_matches_upload(s3):
+    payload = jpeg_bytes()
+    stored = upload(make_request(multipart_body(payload, "image/jpeg", "me.jpg")), spool=True)
+    try:
+        with open(stored["path"], "rb") as f:
+            assert f.read() == payload
+    finally:
+        os.unlink(stored["path"])
+
+
+def test_make_thumbnails_bounds_each_size(tmp_path):
+    path = tmp_path / "avatar.jpg"
+    path.write_bytes(jpeg_bytes((800, 600)))
+
+    thumbnails = make_thumbnails(str(path), [64, 256])
+
+    assert set(thumbnails) == {64, 256}
+    for size, body in thumbnails.items():
+        with Image.open(io.BytesIO(body)) as image:
+            assert image.format == "JPEG"
+            assert max(image.size) == size
+
+
+def test_generate_thumbnails_runs_in_pool_and_rejects_truncated_images(tmp_path):
+    good = tmp_path / "good.jpg"
+    good.write_bytes(jpeg_bytes())
+    truncated = tmp_path / "truncated.jpg"
+    truncated.write_bytes(jpeg_bytes()[:200])
+
+    async def run():
+        thumbnails = await generate_thumbnails(str(good), [64])
+        assert 64 in thumbnails
+        with pytest.raises(HTTPException) as exc:
+            await generate_thumbnails(str(truncated), [64])
+        assert exc.value.status_code == 422
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_image_pool()
+
+
+def test_presigned_urls_are_cached(s3, monkeypatch):
+    calls = []
+    sign = s3.generate_presigned_url
+
+    def counting_sign(*args, **kwargs):
+        calls.append(kwargs["Params"]["Key"])
+        return sign(*args, **kwargs)
+
+    monkeypatch.setattr(s3, "generate_presigned_url", counting_sign)
+    cache = PresignedUrlCache(expires_seconds=3600, max_entries=2)
+
+    first = cache.get("a")
+    assert cache.get("a") == first
+    assert calls == ["a"]
+
+    cache.get("b")
+    cache.get("c")  # evicts "a", the least recently used
+    cache.get("a")
+    assert calls == ["a", "b", "c", "a"]
+
+    cache.invalidate("a")
+    cache.get("a")
+    assert calls.count("a") == 3
+
+
+def test_presigned_urls_are_resigned_after_half_their_lifetime(s3, monkeypatch):
+    calls = []
+    sign = s3.generate_presigned_url
+    monkeypatch.setattr(s3, "generate_presigned_url", lambda *a, **kw: calls.append(1) or sign(*a, **kw))
+    cache = PresignedUrlCache(expires_seconds=3600, max_entries=10)
+    now = uploads.time.monotonic()
+
+    monkeypatch.setattr(uploads.time, "monotonic", lambda: now)
+    cache.get("a")
+    monkeypatch.setattr(uploads.time, "monotonic", lambda: now + 1799)
+    cache.get("a")
+    assert len(calls) == 1
+
+    monkeypatch.setattr(uploads.time, "monotonic", lambda: now + 1801)
+    cache.get("a")
+    assert len(calls) == 2
+
+
+def test_failed_thumbnailing_removes_the_stored_avatar(s3, monkeypatch):
+    from src.routes.uploads import router as uploads_router
+
+    async def broken_pool(path, sizes):
+        raise RuntimeError("process pool died")
+
+    monkeypatch.setattr(uploads_router, "generate_thumbnails", broken_pool)
+    request = make_request(multipart_body(jpeg_bytes(), "image/jpeg", "me.jpg"))
+    user = {"_id": "x", "id": str(uuid4())}
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(uploads_router.upload_avatar(request, current_user=user))
+
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
@@ -0,0 +1,80 @@
+import time
+
+from src.database import search
+from src.database.search import MAX_CHAR, SearchCache, normalize, prefix_query, rank, search_keys_for
+
+
+def user(first, last, email):
+    return {"first_name": first, "last_name": last, "email": email}
+
+
+def test_normalize_trims_lowercases_and_collapses_whitespace():
+    assert normalize("  Priya \t  SHARMA\n") == "priya sharma"
+    assert normalize("") == ""
+    assert normalize(None) == ""
+
+
+def test_search_keys_cover_names_full_name_and_email():
+    keys = search_keys_for(user(" Priya ", "Sharma", "P.Sharma@Example.com"))
+
+    assert keys == sorted(["priya", "sharma", "priya sharma", "p.sharma@example.com", "p.sharma"])
+
+
+def test_search_keys_skip_missing_fields():
+    assert search_keys_for({"email": "ops@example.com"}) == ["ops", "ops@example.com"]
+    assert search_keys_for({}) == []
+
+
+def test_prefix_query_is_a_bounded_range_on_one_key():
+    company = object()
+    query = prefix_query(company, "pri")
+
+    assert query["company_id"] is company
+    assert query["search_keys"] == {"$elemMatch": {"$gte": "pri", "$lt": "pri" + MAX_CHAR}}
+
+
+def test_rank_puts_exact_then_name_then_email_matches_first():
+    email_only = user("Aarav", "Kumar", "sam.ops@example.com")
+    name_prefix = user("Samir", "Khan", "skhan@example.com")
+    exact = user("Sam", "Patel", "sp@example.com")
+    last_name_prefix = user("Arjun", "Samant", "arjun@example.com")
+
+    ranked = rank([email_only, name_prefix, exact, last_name_prefix], "sam")
+
+    assert ranked[0] is exact
+    assert set(map(id, ranked[1:3])) == {id(name_prefix), id(last_name_prefix)}
+    assert ranked[3] is email_only
+
+
+def test_rank_breaks_ties_by_full_name():
+    ranked = rank([user("Priya", "Verma", "a@x"), user("Priya", "Agarwal", "b@x")], "pri")
+
+    assert [u["last_name"] for u in ranked] == ["Agarwal", "Verma"]
+
+
+def test_cache_entries_expire_after_ttl(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(search.time, "monotonic", lambda: now)
+    cache = SearchCache(ttl_seconds=5, max_entries=10)
+    cache.put(("c", "pri", 10), [{"id": 1}])
+
+    monkeypatch.setattr(search.time, "monotonic", lambda: now + 4.9)
+    assert cache.get(("c", "pri", 10)) == [{"id": 1}]
+
+    monkeypatch.setattr(search.time, "monotonic", lambda: now + 5)
+    assert cache.get(("c", "pri", 10)) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = SearchCache(ttl_seconds=60, max_entries=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.get("c") == [3]
+
+    cache.clear()
+    assert cache.get("a") is None